@@ -0,0 +1,57 @@
+-- Enable pgvector for semantic memory search
+create extension if not exists vector;
+
+-- Create memories table
+create table if not exists memories (
+  id uuid default gen_random_uuid() primary key,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  user_id uuid references auth.users not null,
+  content text not null,
+  metadata jsonb default '{}'::jsonb,
+  embedding vector(768) -- see EMBEDDING_DIM in backend/core/embeddings.py
+);
+
+-- Recency fallback
+create index if not exists memories_user_created_at_idx on memories (user_id, created_at desc);
+
+-- Rows stored while the embedding provider was failing, re-embedded by the backend
+create index if not exists memories_missing_embedding_idx on memories (created_at) where embedding is null;
+
+-- Approximate nearest neighbour search on cosine distance
+create index if not exists memories_embedding_hnsw_idx on memories
+  using hnsw (embedding vector_cosine_ops);
+
+-- Enable RLS
+alter table memories enable row level security;
+
+-- Policies
+create policy "Users can view their own memories." on memories
+  for select using (auth.uid() = user_id);
+
+create policy "Users can insert their own memories." on memories
+  for insert with check (auth.uid() = user_id);
+
+create policy "Users can delete their own memories." on memories
+  for delete using (auth.uid() = user_id);
+
+-- Top-k memories for a user by cosine similarity
+create or replace function match_memories(
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int,
+  p_user_id uuid
+)
+returns table (id uuid, created_at timestamp with time zone, content text, metadata jsonb, similarity float)
+language sql
+stable
+as $$
+  select m.id, m.created_at, m.content, m.metadata, 1 - (m.embedding <=> query_embedding) as similarity
+  from memories m
+  where m.user_id = p_user_id
+    and m.embedding is not null
+    and 1 - (m.embedding <=> query_embedding) > match_threshold
+  order by m.embedding <=> query_embedding
+  limit match_count;
+$$;
+
+grant execute on function match_memories(vector, float, int, uuid) to authenticated;
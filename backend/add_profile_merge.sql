@@ -0,0 +1,27 @@
+-- Atomic profile update: merges a patch into profile_data server-side
+-- (profile_data || patch) and sets any given top-level columns in the same
+-- statement, so concurrent writers can't overwrite each other's keys.
+-- Used for agent-extracted updates and PUT /api/profile, which are both partial:
+-- keys whose patch value is null and null columns are skipped rather than erasing
+-- what's stored.
+create or replace function merge_profile_data(
+  p_user_id uuid,
+  p_patch jsonb default '{}'::jsonb,
+  p_full_name text default null,
+  p_family_id uuid default null,
+  p_onboarding_completed boolean default null
+)
+returns setof profiles
+language sql
+as $$
+  update profiles
+  set profile_data = coalesce(profile_data, '{}'::jsonb) || jsonb_strip_nulls(coalesce(p_patch, '{}'::jsonb)),
+      full_name = coalesce(p_full_name, full_name),
+      family_id = coalesce(p_family_id, family_id),
+      onboarding_completed = coalesce(p_onboarding_completed, onboarding_completed),
+      updated_at = now()
+  where id = p_user_id
+  returning *;
+$$;
+
+grant execute on function merge_profile_data(uuid, jsonb, text, uuid, boolean) to authenticated;
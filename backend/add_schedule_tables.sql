@@ -35,3 +35,8 @@ create policy "Users can delete their family schedules." on schedules
   for delete using (
     family_id in (select family_id from profiles where id = auth.uid())
   );
+
+-- Keyset pagination and range filters on (date, time, id); btree indexes scan
+-- backwards too, so these serve both ascending and descending pages.
+create index if not exists schedules_family_date_time_id_idx on schedules (family_id, date, time, id);
+create index if not exists schedules_family_status_date_time_id_idx on schedules (family_id, status, date, time, id);
@@ -0,0 +1,12 @@
+-- Lets device syncs be re-sent safely: bulk ingestion upserts with
+-- ON CONFLICT (user_id, type, recorded_at) DO NOTHING.
+
+-- Drop existing duplicate readings first, keeping the oldest row of each group
+delete from vitals v
+using vitals d
+where v.user_id = d.user_id
+  and v.type = d.type
+  and v.recorded_at = d.recorded_at
+  and (v.created_at, v.id) > (d.created_at, d.id);
+
+create unique index if not exists vitals_user_type_recorded_at_key on vitals (user_id, type, recorded_at);
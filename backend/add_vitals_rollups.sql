@@ -0,0 +1,77 @@
+-- Hourly and daily aggregates of vitals, so history charts read a bounded
+-- number of rows no matter how dense the device data is.
+create table if not exists vitals_rollups (
+  user_id uuid references auth.users not null,
+  type text not null,
+  resolution text not null check (resolution in ('hour', 'day')),
+  bucket timestamp with time zone not null, -- start of the hour/day (UTC)
+  count bigint not null,
+  sum numeric not null,
+  min numeric not null,
+  max numeric not null,
+  primary key (user_id, type, resolution, bucket)
+);
+
+alter table vitals_rollups enable row level security;
+
+create policy "Users can view their own vitals rollups." on vitals_rollups
+  for select using (auth.uid() = user_id);
+
+-- Folds the rows of one insert statement into the rollups. Statement-level with a
+-- transition table, so a bulk insert costs one aggregate per (user, type, bucket)
+-- rather than one upsert per row; rows skipped by ON CONFLICT DO NOTHING aren't counted.
+create or replace function rollup_inserted_vitals()
+returns trigger
+language plpgsql
+security definer
+set search_path = pg_catalog, public -- a caller's schemas can't shadow the tables used here
+as $$
+begin
+  insert into vitals_rollups (user_id, type, resolution, bucket, count, sum, min, max)
+  select n.user_id, n.type, r.resolution, date_trunc(r.resolution, n.recorded_at, 'UTC'),
+         count(*), sum(n.value), min(n.value), max(n.value)
+  from inserted_vitals n
+  cross join (values ('hour'), ('day')) as r(resolution)
+  group by n.user_id, n.type, r.resolution, date_trunc(r.resolution, n.recorded_at, 'UTC')
+  on conflict (user_id, type, resolution, bucket) do update
+    set count = vitals_rollups.count + excluded.count,
+        sum = vitals_rollups.sum + excluded.sum,
+        min = least(vitals_rollups.min, excluded.min),
+        max = greatest(vitals_rollups.max, excluded.max);
+  return null;
+end;
+$$;
+
+drop trigger if exists vitals_rollup_on_insert on vitals;
+create trigger vitals_rollup_on_insert
+  after insert on vitals
+  referencing new table as inserted_vitals
+  for each statement execute function rollup_inserted_vitals();
+
+-- Recomputes rollups from raw rows: backfills existing data after this migration and
+-- repairs buckets after vitals are updated or deleted (which the trigger doesn't track).
+-- Can be run from a scheduled job, e.g. select rebuild_vitals_rollups(null, now() - interval '2 days');
+create or replace function rebuild_vitals_rollups(p_user_id uuid default null, p_since timestamp with time zone default null)
+returns void
+language sql
+security definer
+set search_path = pg_catalog, public
+as $$
+  delete from vitals_rollups
+  where (p_user_id is null or user_id = p_user_id)
+    and (p_since is null or bucket >= date_trunc('day', p_since, 'UTC'));
+
+  insert into vitals_rollups (user_id, type, resolution, bucket, count, sum, min, max)
+  select v.user_id, v.type, r.resolution, date_trunc(r.resolution, v.recorded_at, 'UTC'),
+         count(*), sum(v.value), min(v.value), max(v.value)
+  from vitals v
+  cross join (values ('hour'), ('day')) as r(resolution)
+  where (p_user_id is null or v.user_id = p_user_id)
+    and (p_since is null or v.recorded_at >= date_trunc('day', p_since, 'UTC'))
+  group by v.user_id, v.type, r.resolution, date_trunc(r.resolution, v.recorded_at, 'UTC');
+$$;
+
+-- Runs as the owner over every user's rows, so only the owner (and scheduled jobs) may call it
+revoke execute on function rebuild_vitals_rollups(uuid, timestamp with time zone) from public, anon, authenticated;
+
+select rebuild_vitals_rollups();
@@ -25,3 +25,29 @@ create policy "Users can update their own vitals." on vitals
 
 create policy "Users can delete their own vitals." on vitals
   for delete using (auth.uid() = user_id);
+
+-- Serves "latest reading per type" lookups without scanning a user's history
+create index if not exists vitals_user_type_recorded_at_idx on vitals (user_id, type, recorded_at desc);
+
+-- Latest `p_per_type` readings per (user, type) in one round trip.
+-- Each lateral subquery is a short range scan on the index above, so cost
+-- grows with users x types, not with the number of stored points.
+create or replace function latest_vitals(p_user_ids uuid[], p_types text[], p_per_type int default 2)
+returns table (user_id uuid, type text, value numeric, unit text, recorded_at timestamp with time zone, rank bigint)
+language sql
+stable
+as $$
+  select l.user_id, l.type, l.value, l.unit, l.recorded_at, l.rank
+  from unnest(p_user_ids) as u(uid)
+  cross join unnest(p_types) as t(vtype)
+  cross join lateral (
+    select v.user_id, v.type, v.value, v.unit, v.recorded_at,
+           row_number() over (order by v.recorded_at desc) as rank
+    from vitals v
+    where v.user_id = u.uid and v.type = t.vtype
+    order by v.recorded_at desc
+    limit p_per_type
+  ) l;
+$$;
+
+grant execute on function latest_vitals(uuid[], text[], int) to authenticated;
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import date
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+
+from ..core.tokens import fit_lines, truncate_text
+from ..core.sessions import SessionState
+
+CONTEXT_SUMMARY_MAX_TOKENS = 600
+
+
+class RequestContext(BaseModel):
+    """Everything the agents know about the user for one /chat request."""
+    user_id: str
+    message: str = ""
+    profile: Dict[str, Any] = {}
+    family_members: List[Dict[str, Any]] = []
+    vitals: List[Dict[str, Any]] = []
+    schedule_today: List[Dict[str, Any]] = []
+    memories: List[Dict[str, Any]] = []
+    # Raw context sent by the client, kept for fields the server doesn't store
+    client: Dict[str, Any] = {}
+    session: Optional[SessionState] = None
+
+    @property
+    def family_id(self) -> Optional[str]:
+        return self.profile.get("family_id")
+
+    @property
+    def profile_data(self) -> Dict[str, Any]:
+        return self.profile.get("profile_data") or {}
+
+    def summary(self, max_tokens: int = CONTEXT_SUMMARY_MAX_TOKENS) -> str:
+        """Short plain-text digest of the context for persona prompts, cut to `max_tokens`."""
+        lines = []
+        data = self.profile_data
+        about = ", ".join(f"{k}: {data[k]}" for k in ("name", "age", "sex", "conditions", "medications") if data.get(k))
+        if about:
+            lines.append(f"User: {about}")
+        if self.vitals:
+            lines.append("Latest vitals: " + ", ".join(f"{v['type']} {v['value']} {v['unit']}" for v in self.vitals))
+        if self.schedule_today:
+            lines.append("Today's schedule: " + ", ".join(f"{s['time']} {s['title']} ({s.get('status', 'pending')})" for s in self.schedule_today))
+        if self.family_members:
+            lines.append("Family: " + ", ".join(m.get("full_name") or "Member" for m in self.family_members))
+        if self.memories:
+            lines.append("Relevant memories: " + " | ".join(truncate_text(m["content"], 300) for m in self.memories))
+        if self.session and self.session.recent_turns:
+            lines.append("Recent conversation:\n" + self.session.summary)
+        return "\n".join(fit_lines(lines, max_tokens))
+
+
+async def _safe(coro, default):
+    try:
+        return await coro
+    except Exception as e:
+        print(f"[Context] Fetch failed: {e}")
+        return default
+
+
+async def build_request_context(user_id: str, message: str, client_context: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> RequestContext:
+    """Gathers profile, family, vitals, today's schedule, memories and the session in one concurrent wave."""
+    from ..core.sessions import session_store
+    from ..core.repository import repository
+    from ..core.member_cache import member_cache
+    from ..core.memory import memory_manager
+    from ..services.dashboard_service import VITAL_TYPES
+
+    client_context = client_context or {}
+    client_profile = client_context.get("profile", {}) or {}
+
+    async def family_scoped(family_id: Optional[str]):
+        if not family_id:
+            return [], []
+        return await asyncio.gather(
+            _safe(member_cache.family_members(family_id), []),
+            _safe(repository.list_schedules(family_id, date=date.today().isoformat(), descending=False), []),
+        )
+
+    async def profile_and_family():
+        # The client usually knows the family id already, which lets the family fetches
+        # run alongside the profile lookup; otherwise they follow it
+        known_family_id = client_profile.get("family_id")
+        if known_family_id:
+            profile, family = await asyncio.gather(_safe(repository.get_profile(user_id), None), family_scoped(known_family_id))
+            profile = profile or {}
+            # A stale or foreign id from the client must not pull in another family's data
+            if profile.get("family_id") != known_family_id:
+                family = await family_scoped(profile.get("family_id"))
+            return profile, family
+        profile = await _safe(repository.get_profile(user_id), None) or {}
+        return profile, await family_scoped(profile.get("family_id"))
+
+    (server_profile, (members, schedule_today)), vitals, memories, session = await asyncio.gather(
+        profile_and_family(),
+        _safe(repository.latest_vitals([user_id], VITAL_TYPES, per_type=1), []),
+        _safe(memory_manager.query_memory(user_id, message), []),
+        session_store.get(user_id, session_id),
+    )
+
+    # Older clients still echo conversation state back; fold it into the session
+    if client_profile:
+        session.merge_profile(client_profile)
+        session.client_profile = client_profile
+
+    # Stored fields win; conversation-only state (e.g. suggest_completion) comes from the session
+    profile = {**session.profile, **server_profile}
+    profile["profile_data"] = {**(session.profile.get("profile_data") or {}), **(server_profile.get("profile_data") or {})}
+
+    return RequestContext(
+        user_id=user_id,
+        message=message,
+        profile=profile,
+        family_members=members,
+        vitals=vitals,
+        schedule_today=schedule_today,
+        memories=memories,
+        client=client_context,
+        session=session,
+    )
@@ -0,0 +1,231 @@
+import os
+import re
+import math
+import numpy as np
+from typing import Dict, List, Tuple
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.35"))
+INTENT_LLM_ESCALATION = os.getenv("INTENT_LLM_ESCALATION", "true").lower() == "true"
+
+DEFAULT_PERSONA = "concierge"
+
+# Messages this short that hit no keyword rule go to the concierge without asking the LLM
+INTENT_SHORT_MESSAGE_WORDS = int(os.getenv("INTENT_SHORT_MESSAGE_WORDS", "3"))
+
+# Greetings and small talk that make up the whole message
+SMALL_TALK_RE = re.compile(
+    r"\W*((hi|hello|hey|hiya|yo|good (morning|afternoon|evening|night)|thanks?( you)?( so much)?|thx|ty|"
+    r"ok(ay)?|cool|great|nice|got it|sounds good|bye|goodbye|see you|cheers)( liora)?\W*)+",
+    re.IGNORECASE,
+)
+
+# Whole-word patterns and their weights. A weight of 1.0 or more routes on its own
+# with full confidence (safety terms); smaller weights are combined with the model score.
+KEYWORD_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "guardian": [
+        (r"emergenc(y|ies)|911|ambulance|can'?t breathe|chest pain|overdose|unconscious|seizure|stroke|bleeding heavily", 1.0),
+        (r"hurt(s|ing)?|pain(ful)?|injur(y|ed)|dizzy|faint(ed)?", 0.6),
+        # Injury phrasing only, so "can't fall asleep" or "fell asleep" don't raise an alarm
+        (r"(fell|fallen) (down|over|off|out of|from)|(had|took) a (bad |nasty )?fall|fall(en)? down (the )?stairs", 0.6),
+    ],
+    "strategist": [
+        (r"schedul(e|ed|ing)|remind(er)?s?|appointments?|calendar|routine", 0.7),
+        (r"plan(s|ning)?|add .+ (to|for) (tomorrow|today|monday|tuesday|wednesday|thursday|friday|saturday|sunday)|book(ing)?", 0.5),
+    ],
+    "companion": [
+        (r"sad|lonely|alone|depressed|anxious|anxiety|stressed|overwhelmed|upset|crying|grief|miss (him|her|them)", 0.7),
+        (r"feel(ing)? (down|low|bad)|bad day|vent", 0.6),
+    ],
+    "auditor": [
+        (r"analy[sz]e|analysis|report|trends?|anomal(y|ies)|compare|readings", 0.7),
+        (r"vitals|glucose|blood pressure|heart rate|spo2|lab results?", 0.4),
+    ],
+    "simulator": [
+        (r"simulat(e|ion)|mock|fake data|generate (some |mock |test )?(data|vitals)|test data", 0.9),
+    ],
+}
+
+# Seed utterances for the nearest-centroid model
+TRAINING_EXAMPLES: Dict[str, List[str]] = {
+    "guardian": [
+        "my dad collapsed and is not responding",
+        "I have a sharp pain in my chest",
+        "my son fell off his bike and his arm looks broken",
+        "grandma is very dizzy and confused",
+        "I think I took too many pills",
+        "there is a lot of bleeding what should I do",
+        "I can't breathe properly",
+        "my daughter has a very high fever and is shaking",
+    ],
+    "strategist": [
+        "add a dentist appointment for tomorrow at 3pm",
+        "remind mom to take her medication at 8",
+        "schedule soccer practice for Sarah on Friday",
+        "what does the family calendar look like this week",
+        "move dad's checkup to next Monday",
+        "set up a morning walk routine for me",
+        "plan the meals for the week",
+        "who is picking up the kids today",
+    ],
+    "companion": [
+        "I feel so lonely lately",
+        "today was a really bad day",
+        "I'm stressed about work and can't sleep",
+        "I miss my mom",
+        "I just need someone to talk to",
+        "I'm feeling anxious and overwhelmed",
+        "nobody understands how tired I am",
+        "I've been crying all morning",
+    ],
+    "auditor": [
+        "analyze my heart rate from this week",
+        "is there anything unusual in my vitals",
+        "give me a report on my glucose levels",
+        "how has my blood pressure trended this month",
+        "compare my sleep to last week",
+        "were there any anomalies in dad's readings",
+        "review my lab results",
+        "summarize my health data",
+    ],
+    "simulator": [
+        "simulate some vitals for me",
+        "generate mock health data",
+        "create fake test data for the dashboard",
+        "generate data so I can test the app",
+    ],
+    "concierge": [
+        "hi liora",
+        "what can you do",
+        "tell me about yourself",
+        "what should I eat for dinner",
+        "how much water should I drink a day",
+        "thanks that's helpful",
+        "good morning",
+        "can you recommend a healthy snack",
+        "hello there",
+        "hey",
+        "thank you so much",
+        "ok got it",
+        "bye see you later",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class IntentRouter:
+    """Sub-millisecond persona routing.
+
+    A compiled keyword automaton and a TF-IDF nearest-centroid model score every
+    persona locally; only messages neither is confident about are sent to the LLM.
+    """
+
+    def __init__(self, threshold: float = INTENT_CONFIDENCE_THRESHOLD, llm_escalation: bool = INTENT_LLM_ESCALATION):
+        self.threshold = threshold
+        self.llm_escalation = llm_escalation
+        self.personas = list(TRAINING_EXAMPLES.keys())
+
+        # One alternation regex for all rules; the named group tells us which rule matched
+        self._rule_weights: Dict[str, Tuple[str, float]] = {}
+        alternatives = []
+        for persona, rules in KEYWORD_RULES.items():
+            for i, (pattern, weight) in enumerate(rules):
+                group = f"{persona}_{i}"
+                self._rule_weights[group] = (persona, weight)
+                alternatives.append(f"(?P<{group}>\\b(?:{pattern})\\b)")
+        self._automaton = re.compile("|".join(alternatives), re.IGNORECASE)
+
+        self._fit()
+
+    def _fit(self):
+        documents = [(persona, _tokenize(text)) for persona, texts in TRAINING_EXAMPLES.items() for text in texts]
+        vocabulary = sorted({token for _, tokens in documents for token in tokens})
+        self._vocab = {token: i for i, token in enumerate(vocabulary)}
+
+        doc_freq = np.zeros(len(vocabulary))
+        for _, tokens in documents:
+            for token in set(tokens):
+                doc_freq[self._vocab[token]] += 1
+        self._idf = np.log((1 + len(documents)) / (1 + doc_freq)) + 1
+
+        centroids = np.zeros((len(self.personas), len(vocabulary)))
+        for persona, tokens in documents:
+            centroids[self.personas.index(persona)] += self._vectorize(tokens)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = centroids / np.where(norms == 0, 1, norms)
+
+    def _vectorize(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(len(self._vocab))
+        for token in tokens:
+            index = self._vocab.get(token)
+            if index is not None:
+                vector[index] += 1
+        vector *= self._idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def score(self, message: str) -> Dict[str, float]:
+        """Combined keyword + centroid score per persona."""
+        scores = dict.fromkeys(self.personas, 0.0)
+
+        for match in self._automaton.finditer(message):
+            persona, weight = self._rule_weights[match.lastgroup]
+            scores[persona] = max(scores[persona], weight)
+
+        similarities = self._centroids @ self._vectorize(_tokenize(message))
+        for persona, similarity in zip(self.personas, similarities):
+            scores[persona] += float(similarity)
+        return scores
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Best local guess and a confidence in [0, 1]."""
+        if SMALL_TALK_RE.fullmatch(message):
+            return DEFAULT_PERSONA, 1.0
+        scores = self.score(message)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, top), (_, runner_up) = ranked[0], ranked[1]
+
+        if top >= 1.0 and ranked[0][0] == "guardian":
+            return best, 1.0
+        if top <= 0:
+            return DEFAULT_PERSONA, 0.0
+
+        # Softmax over the two leading scores, scaled by how strong the winner is
+        margin = 1 / (1 + math.exp(-8 * (top - runner_up)))
+        return best, round(min(1.0, top) * (2 * margin - 1), 3)
+
+    async def route(self, message: str) -> Tuple[str, float, str]:
+        """Returns (persona, confidence, source), where source is "local" or "llm"."""
+        persona, confidence = self.classify(message)
+        if confidence >= self.threshold:
+            return persona, confidence, "local"
+        if len(_TOKEN_RE.findall(message.lower())) <= INTENT_SHORT_MESSAGE_WORDS and not self._automaton.search(message):
+            return DEFAULT_PERSONA, confidence, "local"
+
+        llm_persona = await self._ask_llm(message) if self.llm_escalation else ""
+        if llm_persona:
+            return llm_persona, confidence, "llm"
+        # Too unsure to act on a specialist persona
+        return DEFAULT_PERSONA, confidence, "local"
+
+    async def _ask_llm(self, message: str) -> str:
+        from backend.core.llm import llm_client
+
+        instruction = (
+            "Classify the user's message for a family health assistant. "
+            f"Answer with exactly one word from: {', '.join(self.personas)}. "
+            "guardian = urgent safety or physical harm, strategist = schedules and logistics, "
+            "companion = emotional support, auditor = analysis of health data, "
+            "simulator = generating mock data, concierge = anything else."
+        )
+        answer = await llm_client.generate_response(message, system_instruction=instruction, agent="intent")
+        label = answer.strip().lower().strip(".")
+        return label if label in self.personas else ""
+
+
+intent_router = IntentRouter()
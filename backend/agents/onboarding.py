@@ -1,21 +1,21 @@
-import json
 from typing import Dict, Any, List, Optional, Tuple
 from backend.core.llm import llm_client
+from backend.core.tokens import compact_json, compact_prompt
+from backend.core.structured import OnboardingOutput
+from .context import RequestContext
 
 class OnboardingAgent:
     def __init__(self):
-        import os
-        from supabase import create_client, Client
-        
-        url: str = os.environ.get("SUPABASE_URL")
-        key: str = os.environ.get("SUPABASE_KEY")
-        if url and key:
-            self.supabase: Client = create_client(url, key)
-        else:
+        try:
+            from backend.core.database import supabase
+            from backend.core.repository import repository
+            self.supabase = supabase
+            self.repository = repository
+        except ValueError:
             self.supabase = None
             print("Warning: SUPABASE_URL or SUPABASE_KEY not found in OnboardingAgent")
 
-        self.system_instruction = """
+        self.system_instruction = compact_prompt("""
 
 You are Liora, an intelligent and empathetic Agentic Health OS. 
 You are currently in the "Onboarding Phase" with a new user.
@@ -61,8 +61,6 @@ Existing Profile Data: {profile_context}
    - **JOINER FLOW (If role is 'joiner'):**
      - **IF** `family_id` is MISSING:
        - Ask for the Family Invite Code (e.g., "Do you have the 6-character code from the Pioneer?").
-       - Ask for the Family Invite Code (e.g., "Do you have the 6-character code from the Pioneer?").
-       - **IF** user provides a code (looks like "LIORA-XXXXXX" or similar) -> Output `check_family_code: "CODE"`. 
        - **IF** user provides a code (looks like "LIORA-XXXXXX" or similar) -> Output `check_family_code: "CODE"`. 
        - **CRITICAL:** DO NOT output `check_family_code` if the user has NOT provided a specific code. Do NOT guess.
        - **CRITICAL:** If `role` is 'pioneer', NEVER output `check_family_code`. Pioneers CREATE families, they do not join them.
@@ -98,12 +96,12 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
         }}
     }}
 }}
-        """
+        """)
 
-    async def process_message(self, message: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None) -> Tuple[str, Dict[str, Any]]:
+    async def process_message(self, message: str, ctx: RequestContext, attachments: Optional[List[Dict[str, str]]] = None) -> Tuple[str, Dict[str, Any]]:
         # Prepare context string
-        profile_obj = context.get("profile", {})
-        current_data = profile_obj.get("profile_data", {})
+        profile_obj = ctx.profile
+        current_data = ctx.profile_data
         suggest_completion_state = profile_obj.get("suggest_completion", False)
         
         # Add role and family_id to context for LLM awareness
@@ -117,7 +115,8 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
             "family_id": family_id
         }
         
-        profile_context = json.dumps(context_summary, indent=2)
+        # Compact form: no indentation, unknown (null) fields dropped
+        profile_context = compact_json(context_summary)
         state_context = f"suggest_completion: {str(suggest_completion_state).lower()}"
         
         instruction = self.system_instruction.format(
@@ -130,45 +129,21 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
         
         print(f"[Onboarding] Processing message: '{message}' with state: {state_context}")
 
-        raw_response = await llm_client.generate_response(prompt, system_instruction=instruction, attachments=attachments)
-        
-        # Parse JSON response
-        try:
-            # Robust JSON extraction using brace counting
-            start_idx = raw_response.find('{')
-            if start_idx != -1:
-                brace_count = 0
-                end_idx = -1
-                for i, char in enumerate(raw_response[start_idx:], start=start_idx):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end_idx = i + 1
-                            break
-                if end_idx != -1:
-                    clean_response = raw_response[start_idx:end_idx]
-                else:
-                     clean_response = raw_response.strip() # Fallback
-            else:
-                clean_response = raw_response.strip()
+        parsed, raw_response = await llm_client.generate_structured(prompt, OnboardingOutput, system_instruction=instruction, attachments=attachments, agent="onboarding")
+        if parsed is None:
+            print(f"Failed to parse JSON from LLM: {raw_response}")
+            return raw_response, {}
 
-            # Remove any potential JS-style comments if they still appear
-            import re
-            clean_response = re.sub(r'//.*', '', clean_response)
-            
-            parsed = json.loads(clean_response)
-            
-            response_text = parsed.get("response", "I'm having trouble understanding. Could you repeat that?")
-            updates = parsed.get("updates", {})
+        try:
+            response_text = parsed.response
+            updates = parsed.updates.model_dump(exclude_none=True)
             
             print(f"[Onboarding] LLM Updates: {updates}")
 
             # --- HANDLE FAMILY CODE CHECK ---
             if "check_family_code" in updates and self.supabase:
                 # STRICT GUARD: Pioneers never check codes
-                if context.get("profile", {}).get("role") == "pioneer":
+                if profile_obj.get("role") == "pioneer":
                     print("[Onboarding] Blocked code check for Pioneer role.")
                     del updates["check_family_code"]
                 else:
@@ -182,10 +157,10 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
                         print(f"[Onboarding] Validating family code: {code}")
                         try:
                             # Query Supabase using the secure RPC function
-                            res = self.supabase.rpc("check_family_code", {"code": code}).execute()
+                            matches = await self.repository.check_family_code(code)
                             
-                            if res.data and len(res.data) > 0:
-                                family = res.data[0]
+                            if matches:
+                                family = matches[0]
                                 updates["join_family_id"] = family["id"]
                                 updates["family_name"] = family["name"]
                                 
@@ -203,7 +178,7 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
             # Check for completion and Pioneer role
             # We need to check if the AI *just* marked it as complete
             if updates.get("onboarding_completed"):
-                role = context.get("profile", {}).get("role")
+                role = profile_obj.get("role")
                 if role == "pioneer":
                     import random
                     import string
@@ -213,8 +188,8 @@ Return ONLY a JSON object. Do NOT include comments (//) in the JSON.
                     updates["family_code"] = code
             
             return response_text, updates
-        except json.JSONDecodeError:
-            print(f"Failed to parse JSON from LLM: {raw_response}")
-            return raw_response, {}
+        except Exception as e:
+            print(f"[Onboarding] Error handling updates: {e}")
+            return parsed.response, {}
 
 onboarding_agent = OnboardingAgent()
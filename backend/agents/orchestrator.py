@@ -1,5 +1,29 @@
-from typing import Dict, Any, Tuple, List, Optional
+from typing import Dict, Any, Tuple, List, Optional, AsyncIterator
 from ..core.llm import llm_client
+from ..core.lazy import components
+from ..core.sessions import session_store
+from .intent_router import intent_router
+from .context import RequestContext, build_request_context
+from ..services.anomaly_service import anomaly_engine
+
+# Personas answered with free text, so their tokens can be forwarded as they arrive.
+# The structured agents (onboarding, strategist, simulator) need the full JSON first.
+STREAMING_PERSONAS = {"concierge", "auditor", "guardian", "companion"}
+
+# Safety-critical replies are always generated fresh, never served from the LLM cache
+UNCACHED_PERSONAS = {"guardian"}
+
+# Structured agents, imported and constructed the first time a message is routed to them
+AGENTS = {
+    "onboarding": ("backend.agents.onboarding", "onboarding_agent"),
+    "strategist": ("backend.agents.strategist", "strategist_agent"),
+    "simulator": ("backend.agents.simulation", "simulation_agent"),
+}
+for _name, (_module, _attribute) in AGENTS.items():
+    components.register_import(f"agent.{_name}", _module, _attribute)
+
+def get_agent(name: str):
+    return components.get(f"agent.{name}")
 
 class AgentOrchestrator:
     def __init__(self):
@@ -12,47 +36,79 @@ class AgentOrchestrator:
         }
 
     async def determine_persona(self, message: str, context: Dict[str, Any]) -> str:
-        # Simple keyword-based logic for now, can be upgraded to LLM-based classification
-        message_lower = message.lower()
-        
-        if "emergency" in message_lower or "hurt" in message_lower or "pain" in message_lower:
-            return "guardian"
-        elif "plan" in message_lower or "schedule" in message_lower:
-            return "strategist"
-        elif "sad" in message_lower or "lonely" in message_lower:
-            return "companion"
-        elif "analyze" in message_lower or "report" in message_lower:
-            return "auditor"
-        elif "simulate" in message_lower or "mock" in message_lower or "generate data" in message_lower:
-            return "simulator"
-        else:
-            return "concierge"
-
-    async def process_message(self, message: str, user_id: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None, token: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        # Local keyword automaton + TF-IDF model; only uncertain messages go to the LLM
+        persona, _, _ = await intent_router.route(message)
+        return persona
+
+    def persona_instruction(self, persona_key: str, ctx: RequestContext) -> str:
+        instruction = self.personas.get(persona_key, self.personas["concierge"])
+        summary = ctx.summary()
+        return f"{instruction}\n\nWhat you know about the user:\n{summary}" if summary else instruction
+
+    async def system_instruction(self, persona_key: str, ctx: RequestContext) -> str:
+        instruction = self.persona_instruction(persona_key, ctx)
+        if persona_key == "auditor":
+            # The Auditor reasons over precomputed findings rather than raw series
+            report = await anomaly_engine.family_report(ctx)
+            if report:
+                instruction = f"{instruction}\n\n{report}\nBase your analysis on these findings; don't invent readings."
+        return instruction
+
+    @staticmethod
+    def cacheable(persona_key: str, ctx: RequestContext) -> bool:
+        # Once a session has turns, the instruction carries the recent conversation, so an
+        # identical message may need a different answer; only fresh conversations are cached
+        if persona_key in UNCACHED_PERSONAS:
+            return False
+        return not (ctx.session and ctx.session.recent_turns)
+
+    async def process_message(self, message: str, user_id: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None, token: Optional[str] = None, session_id: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        ctx = await build_request_context(user_id, message, context, session_id)
+        response, updates = await self._dispatch(message, ctx, attachments)
+        await session_store.record_turn(ctx.session, message, response, updates)
+        return response, updates
+
+    async def _dispatch(self, message: str, ctx: RequestContext, attachments: Optional[List[Dict[str, str]]] = None, persona_key: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         # Check if user is in onboarding mode
-        is_onboarding = not context.get("profile", {}).get("onboarding_completed", False)
+        is_onboarding = not ctx.profile.get("onboarding_completed", False)
         
         if is_onboarding:
-            from .onboarding import onboarding_agent
-            return await onboarding_agent.process_message(message, context, attachments)
+            return await get_agent("onboarding").process_message(message, ctx, attachments)
 
-        persona_key = await self.determine_persona(message, context)
+        persona_key = persona_key or await self.determine_persona(message, ctx.client)
         
         if persona_key == "strategist":
-            from .strategist import strategist_agent
-            response = await strategist_agent.process_message(message, context, attachments)
+            response = await get_agent("strategist").process_message(message, ctx, attachments)
             return response, {}
             
         if persona_key == "simulator":
-            from .simulation import simulation_agent
-            # Ensure user_id is in context for the simulation agent
-            context["user_id"] = user_id
-            response = await simulation_agent.process_message(message, context, attachments)
+            response = await get_agent("simulator").process_message(message, ctx, attachments)
             return response, {}
 
-        system_instruction = self.personas.get(persona_key, self.personas["concierge"])
+        system_instruction = await self.system_instruction(persona_key, ctx)
         
-        response = await llm_client.generate_response(message, system_instruction=system_instruction, attachments=attachments)
+        response = await llm_client.generate_response(message, system_instruction=system_instruction, attachments=attachments, cache=self.cacheable(persona_key, ctx), agent=persona_key)
         return response, {}
 
+    async def stream_message(self, message: str, user_id: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None, token: Optional[str] = None, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields {"type": "token"} events followed by one {"type": "done"} event carrying the updates."""
+        ctx = await build_request_context(user_id, message, context, session_id)
+        is_onboarding = not ctx.profile.get("onboarding_completed", False)
+        persona_key = None if is_onboarding else await self.determine_persona(message, ctx.client)
+
+        if persona_key in STREAMING_PERSONAS:
+            system_instruction = await self.system_instruction(persona_key, ctx)
+            chunks = []
+            async for chunk in llm_client.stream_response(message, system_instruction=system_instruction, attachments=attachments, cache=self.cacheable(persona_key, ctx), agent=persona_key):
+                chunks.append(chunk)
+                yield {"type": "token", "content": chunk}
+            await session_store.record_turn(ctx.session, message, "".join(chunks))
+            yield {"type": "done", "agent": persona_key, "updates": {}}
+            return
+
+        response, updates = await self._dispatch(message, ctx, attachments, persona_key)
+        await session_store.record_turn(ctx.session, message, response, updates)
+        yield {"type": "token", "content": response}
+        yield {"type": "done", "agent": persona_key or "onboarding", "updates": updates}
+
 orchestrator = AgentOrchestrator()
@@ -1,13 +1,17 @@
 from typing import Dict, Any, Optional, List
-import json
 import random
 from datetime import datetime, timedelta
 from ..core.llm import llm_client
-from ..core.database import supabase
+from ..core.tokens import compact_prompt
+from ..core.repository import repository
+from ..core.structured import SimulationOutput
+from ..services.dashboard_service import dashboard_service
+from ..services.anomaly_service import anomaly_engine
+from .context import RequestContext
 
 class SimulationAgent:
     def __init__(self):
-        self.system_instruction = """
+        self.system_instruction = compact_prompt("""
         You are The Simulator, a specialized agent within Liora responsible for generating realistic mock health data for testing and demonstration purposes.
         
         When a user asks to "simulate vitals", "generate mock data", or similar, your job is to:
@@ -32,14 +36,14 @@ class SimulationAgent:
             ],
             "response": "I've generated some fresh health data for you based on your profile."
         }
-        """
+        """)
 
-    async def process_message(self, message: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None) -> str:
+    async def process_message(self, message: str, ctx: RequestContext, attachments: Optional[List[Dict[str, str]]] = None) -> str:
         # Get user profile for context
-        profile = context.get("profile", {})
-        age = profile.get("profile_data", {}).get("age", "unknown")
-        gender = profile.get("profile_data", {}).get("gender", "unknown")
-        conditions = profile.get("profile_data", {}).get("conditions", [])
+        profile = ctx.profile
+        age = ctx.profile_data.get("age", "unknown")
+        gender = ctx.profile_data.get("gender", "unknown")
+        conditions = ctx.profile_data.get("conditions", [])
         
         prompt = f"""
         User Profile:
@@ -53,23 +57,13 @@ class SimulationAgent:
         """
         
         try:
-            response_text = await llm_client.generate_response(prompt, system_instruction=self.system_instruction)
-            
-            # Clean up response to ensure it's valid JSON
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            
-            try:
-                parsed_response = json.loads(response_text)
-            except json.JSONDecodeError:
+            parsed, response_text = await llm_client.generate_structured(prompt, SimulationOutput, system_instruction=self.system_instruction, agent="simulator")
+            if parsed is None:
                 return response_text
 
-            if parsed_response.get("action") == "generate_vitals":
-                data_points = parsed_response.get("data", [])
-                user_id = context.get("user_id")
+            if parsed.action == "generate_vitals":
+                data_points = parsed.data
+                user_id = ctx.user_id
                 
                 if not user_id:
                     return "I can't generate data because I don't know who you are."
@@ -79,25 +73,28 @@ class SimulationAgent:
                 for point in data_points:
                     records.append({
                         "user_id": user_id,
-                        "type": point["type"],
-                        "value": point["value"],
-                        "unit": point["unit"],
+                        "type": point.type,
+                        "value": point.value,
+                        "unit": point.unit,
                         "source": "simulation",
                         "recorded_at": datetime.now().isoformat()
                     })
                 
                 if records:
-                    res = supabase.table("vitals").insert(records).execute()
+                    inserted = await repository.insert_vitals(records)
                     
-                    if res.data:
-                        return parsed_response.get("response", "Data generated successfully.")
+                    if inserted:
+                        anomaly_engine.observe(user_id, records)
+                        dashboard_service.invalidate_member(user_id)
+                        dashboard_service.invalidate_family(profile.get("family_id"))
+                        return parsed.response or "Data generated successfully."
                     else:
                         return "I generated the data but couldn't save it to the database."
                 else:
                     return "I couldn't generate any valid data points."
             
             else:
-                return parsed_response.get("response", response_text)
+                return parsed.response or response_text
 
         except Exception as e:
             print(f"Simulation Error: {e}")
@@ -1,12 +1,15 @@
 from typing import Dict, Any, Optional, List
-import json
 from datetime import datetime, timedelta
 from ..core.llm import llm_client
-from ..core.database import supabase
+from ..core.tokens import compact_prompt
+from ..core.repository import repository
+from ..core.structured import StrategistOutput
+from ..services.dashboard_service import dashboard_service
+from .context import RequestContext
 
 class StrategistAgent:
     def __init__(self):
-        self.system_instruction = """
+        self.system_instruction = compact_prompt("""
         You are The Strategist, a specialized agent within Liora responsible for managing family schedules and routines.
         Your goal is to help users organize their time efficiently.
         
@@ -29,9 +32,9 @@ class StrategistAgent:
         }
         
         If you cannot extract all necessary information, ask for clarification in the "response" field and set "action" to "clarify".
-        """
+        """)
 
-    async def process_message(self, message: str, context: Dict[str, Any], attachments: Optional[List[Dict[str, str]]] = None) -> str:
+    async def process_message(self, message: str, ctx: RequestContext, attachments: Optional[List[Dict[str, str]]] = None) -> str:
         # Add current date to context for the LLM
         current_date = datetime.now().strftime("%Y-%m-%d")
         day_name = datetime.now().strftime("%A")
@@ -44,40 +47,33 @@ class StrategistAgent:
         """
         
         try:
-            response_text = await llm_client.generate_response(prompt, system_instruction=self.system_instruction)
-            
-            # Clean up response to ensure it's valid JSON
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            
-            try:
-                parsed_response = json.loads(response_text)
-            except json.JSONDecodeError:
+            parsed, response_text = await llm_client.generate_structured(prompt, StrategistOutput, system_instruction=self.system_instruction, agent="strategist")
+            if parsed is None:
                 # Fallback if LLM doesn't return valid JSON
                 return response_text
 
-            if parsed_response.get("action") == "create_schedule":
-                data = parsed_response.get("data")
-                family_id = context.get("profile", {}).get("family_id")
+            if parsed.action == "create_schedule":
+                data = parsed.data
+                family_id = ctx.family_id
                 
                 if not family_id:
                     return "I can't add that to the schedule because I don't know which family you belong to."
 
+                if not data or not (data.title and data.time and data.date):
+                    return parsed.response or "Could you tell me what to schedule, and for which day and time?"
+
                 # Resolve assignee
                 assigned_to_id = None
-                if data.get("assigned_to_name") and data["assigned_to_name"].lower() != "family":
+                if data.assigned_to_name and data.assigned_to_name.lower() != "family":
                     # Try to find member by name or role
-                    # Fetch family members with profile_data to check for roles/nicknames
-                    members_res = supabase.table("profiles").select("id, full_name, profile_data").eq("family_id", family_id).execute()
+                    # Family members (with profile_data for roles/nicknames) come from the request context
+                    members = ctx.family_members
                     
-                    if members_res.data:
-                        target_name = data["assigned_to_name"].lower()
-                        for m in members_res.data:
+                    if members:
+                        target_name = data.assigned_to_name.lower()
+                        for m in members:
                             # Check full name
-                            if target_name in m["full_name"].lower():
+                            if target_name in (m.get("full_name") or "").lower():
                                 assigned_to_id = m["id"]
                                 break
                             
@@ -91,29 +87,30 @@ class StrategistAgent:
                                     break
                 
                 new_schedule = {
-                    "title": data["title"],
-                    "time": data["time"],
-                    "type": data["type"],
-                    "date": data["date"],
+                    "title": data.title,
+                    "time": data.time,
+                    "type": data.type,
+                    "date": data.date,
                     "family_id": family_id,
                     "assigned_to": assigned_to_id,
                     "status": "pending"
                 }
                 
                 # Insert into Supabase
-                res = supabase.table("schedules").insert(new_schedule).execute()
+                created = await repository.insert_schedule(new_schedule)
                 
-                if res.data:
-                    return parsed_response.get("response", "Done! I've added that to the schedule.")
+                if created:
+                    dashboard_service.invalidate_family(family_id)
+                    return parsed.response or "Done! I've added that to the schedule."
                 else:
                     return "I tried to add that to the schedule, but something went wrong."
             
-            elif parsed_response.get("action") == "clarify":
-                return parsed_response.get("response")
+            elif parsed.action == "clarify":
+                return parsed.response
             
             else:
                 # If action is unknown or missing, just return the response text (fallback)
-                return parsed_response.get("response", response_text)
+                return parsed.response or response_text
 
         except Exception as e:
             print(f"Strategist Error: {e}")
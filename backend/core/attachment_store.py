@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import tempfile
+from typing import Dict, Any, Optional
+
+from fastapi import UploadFile
+
+from backend.core.attachments import ATTACHMENT_MAX_BYTES
+
+ATTACHMENT_STORE_DIR = os.getenv("ATTACHMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "liora-attachments"))
+ATTACHMENT_STORE_TTL = float(os.getenv("ATTACHMENT_STORE_TTL", "3600"))
+# Expired files are swept at most this often, from whichever upload comes next
+ATTACHMENT_STORE_SWEEP_INTERVAL = float(os.getenv("ATTACHMENT_STORE_SWEEP_INTERVAL", "300"))
+# Files younger than this may still be mid-upload, so they are never treated as broken or orphaned
+ATTACHMENT_STORE_GRACE = 600.0
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class AttachmentStore:
+    """Spools uploads to disk and hands out ids the chat path can reference.
+
+    Each upload is written as `<id>.bin` with a `<id>.json` sidecar holding its
+    owner, name, type, size and SHA-256, so any worker on the host can resolve it.
+    Only the user who uploaded a file can reference it.
+    """
+
+    def __init__(self, directory: str = ATTACHMENT_STORE_DIR, ttl: float = ATTACHMENT_STORE_TTL, sweep_interval: float = ATTACHMENT_STORE_SWEEP_INTERVAL):
+        self.directory = directory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, attachment_id: str) -> str:
+        # ids are generated here, never trusted blindly from the client
+        return os.path.join(self.directory, f"{uuid.UUID(attachment_id)}.bin")
+
+    async def save(self, upload: UploadFile, owner: str) -> Dict[str, Any]:
+        attachment_id = str(uuid.uuid4())
+        digest = hashlib.sha256()
+        size = 0
+        path = self.path(attachment_id)
+        try:
+            with open(path, "wb") as f:
+                while chunk := await upload.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > ATTACHMENT_MAX_BYTES:
+                        raise AttachmentTooLarge(f"{upload.filename} exceeds {ATTACHMENT_MAX_BYTES} bytes")
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        meta = {
+            "id": attachment_id,
+            "owner": owner,
+            "name": upload.filename or "file",
+            "type": upload.content_type or "application/octet-stream",
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "expires_at": time.time() + self.ttl,
+        }
+        await asyncio.to_thread(self._write_meta, meta)
+
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = time.time()
+            await asyncio.to_thread(self.purge_expired)
+        return meta
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        # Written aside and renamed, so readers (and the sweep) never see a half-written sidecar
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._meta_path(meta["id"]))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, attachment_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(attachment_id)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta["expires_at"] < time.time():
+            return None
+        return meta
+
+    def reference(self, attachment_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        """Attachment dict that points at the stored file instead of inlining its bytes; None unless `owner` uploaded it."""
+        meta = self.get(attachment_id)
+        if not meta or meta.get("owner") != owner:
+            return None
+        return {"type": meta["type"], "name": meta["name"], "ref": meta["id"], "sha256": meta["sha256"]}
+
+    def purge_expired(self):
+        """Removes expired uploads, plus unreadable sidecars, stray temp files and
+        `.bin` files without a sidecar once they are older than ATTACHMENT_STORE_GRACE."""
+        now = time.time()
+        entries = {}
+        for entry in os.scandir(self.directory):
+            try:
+                entries[entry.name] = entry.stat().st_mtime
+            except OSError:
+                continue
+
+        for name, mtime in entries.items():
+            stale = now - mtime > ATTACHMENT_STORE_GRACE
+            stem, ext = os.path.splitext(name)
+            if ext == ".tmp":
+                if stale:
+                    self._remove(os.path.join(self.directory, name))
+                continue
+            try:
+                attachment_id = str(uuid.UUID(stem))
+            except ValueError:
+                continue
+            if ext == ".bin":
+                if stale and f"{attachment_id}.json" not in entries:
+                    self._remove(self.path(attachment_id))
+            elif ext == ".json":
+                try:
+                    with open(self._meta_path(attachment_id)) as f:
+                        expires_at = json.load(f)["expires_at"]
+                except (OSError, ValueError, KeyError, TypeError):
+                    expires_at = None
+                if (expires_at is None and stale) or (expires_at is not None and expires_at < now):
+                    self._remove(self._meta_path(attachment_id))
+                    self._remove(self.path(attachment_id))
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _meta_path(self, attachment_id: str) -> str:
+        return os.path.join(self.directory, f"{uuid.UUID(attachment_id)}.json")
+
+
+attachment_store = AttachmentStore()
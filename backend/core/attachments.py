@@ -0,0 +1,161 @@
+import os
+import io
+import base64
+import binascii
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from backend.core.cache import TTLCache
+
+ATTACHMENT_WORKERS = int(os.getenv("ATTACHMENT_WORKERS", "2"))
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+EXTRACTED_TEXT_MAX_CHARS = int(os.getenv("EXTRACTED_TEXT_MAX_CHARS", "100000"))
+
+# Extracted text keyed by the SHA-256 of the upload, so re-sent reports skip the worker pool
+_text_cache = TTLCache(ttl=float(os.getenv("ATTACHMENT_CACHE_TTL", "3600")), maxsize=256)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_worker_pool() -> ProcessPoolExecutor:
+    """Process pool shared by the CPU-heavy attachment stages (text extraction, image resizing)."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=ATTACHMENT_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _extract_in_worker(source: str, from_path: bool, mime: str, max_bytes: int, max_pages: int, max_chars: int) -> str:
+    """Runs in a worker process: reads the stored file or decodes base64, then extracts text within the given limits."""
+    if from_path:
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        data = base64.b64decode(source)
+    if len(data) > max_bytes:
+        raise ValueError(f"attachment is {len(data)} bytes, limit is {max_bytes}")
+
+    if mime == "application/pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(data))
+        pages = []
+        size = 0
+        # Pages are parsed one at a time, so hitting a limit stops the work early
+        for number, page in enumerate(reader.pages):
+            if number >= max_pages:
+                pages.append(f"[Truncated after {max_pages} of {len(reader.pages)} pages]")
+                break
+            text = page.extract_text() or ""
+            pages.append(text)
+            size += len(text)
+            if size >= max_chars:
+                break
+        return "\n".join(pages)[:max_chars]
+
+    return data.decode("utf-8")[:max_chars]
+
+
+def is_extractable(mime: str) -> bool:
+    return mime.startswith("text/") or mime in ("application/json", "application/pdf")
+
+
+def has_content(att: Dict[str, Any]) -> bool:
+    return "data" in att or "ref" in att or "bytes" in att
+
+
+def attachment_digest(att: Dict[str, Any]) -> str:
+    """SHA-256 of the attachment's decoded content.
+
+    Stored uploads (ref) and preprocessed images (bytes) carry the digest computed when
+    the server produced them; inline data is always hashed here, never taken from the client.
+    """
+    if ("ref" in att or "bytes" in att) and att.get("sha256"):
+        return att["sha256"]
+    if "bytes" in att:
+        return hashlib.sha256(att["bytes"]).hexdigest()
+    data = att.get("data", "")
+    try:
+        raw = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        # Undecodable data fails later anyway; hash it as sent so the key is still stable
+        raw = data.encode() if isinstance(data, str) else data
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _read_ref(att: Dict[str, Any]) -> bytes:
+    from backend.core.attachment_store import attachment_store
+    with open(attachment_store.path(att["ref"]), "rb") as f:
+        return f.read()
+
+
+async def attachment_bytes(att: Dict[str, Any]) -> bytes:
+    """Raw bytes of an inline (base64), stored (ref) or preprocessed (bytes) attachment."""
+    if "bytes" in att:
+        return att["bytes"]
+    if "ref" in att:
+        return await asyncio.to_thread(_read_ref, att)
+    return await asyncio.to_thread(base64.b64decode, att["data"])
+
+
+async def attachment_base64(att: Dict[str, Any]) -> str:
+    """Base64 form for providers that only take data URIs; inline attachments pass through untouched."""
+    if "data" in att:
+        return att["data"]
+    data = await attachment_bytes(att)
+    return await asyncio.to_thread(lambda: base64.b64encode(data).decode())
+
+
+async def extract_text(att: Dict[str, Any]) -> str:
+    """Text content of a PDF/text attachment, extracted off the event loop and cached by content hash."""
+    mime = att.get("type", "application/octet-stream")
+    key = attachment_digest(att)
+
+    cached = _text_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if "ref" in att:
+        # Only the path crosses the process boundary; the worker reads the file itself
+        from backend.core.attachment_store import attachment_store
+        source, from_path = attachment_store.path(att["ref"]), True
+    else:
+        source, from_path = att["data"], False
+
+    loop = asyncio.get_running_loop()
+    text = await loop.run_in_executor(
+        get_worker_pool(), _extract_in_worker, source, from_path, mime, ATTACHMENT_MAX_BYTES, PDF_MAX_PAGES, EXTRACTED_TEXT_MAX_CHARS
+    )
+    _text_cache.set(key, text)
+    return text
+
+
+async def describe_attachments(attachments: Optional[List[Dict[str, Any]]]) -> List[Optional[str]]:
+    """Prompt text for each non-image attachment (None for images), extracted concurrently."""
+    attachments = attachments or []
+
+    async def describe(att: Dict[str, Any]) -> Optional[str]:
+        mime = att.get("type", "application/octet-stream")
+        name = att.get("name", "file")
+        if not has_content(att) or mime.startswith("image/"):
+            return None
+        if not is_extractable(mime):
+            return f"[Attached File: {name} ({mime}) - Content not extracted]"
+        label = "PDF" if mime == "application/pdf" else "File"
+        try:
+            return f"[Attached {label}: {name}]\n{await extract_text(att)}"
+        except Exception as e:
+            print(f"Failed to extract attachment {name}: {e}")
+            return f"[Attached {label}: {name} - Error reading content]"
+
+    return await asyncio.gather(*(describe(att) for att in attachments))
@@ -1,7 +1,12 @@
 import os
+import httpx
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
+from postgrest import SyncPostgrestClient
 from dotenv import load_dotenv
 
+from backend.core.cache import TTLCache
+
 load_dotenv()
 
 url: str = os.environ.get("SUPABASE_URL")
@@ -10,10 +15,48 @@ key: str = os.environ.get("SUPABASE_KEY")
 if not url or not key:
     raise ValueError("Supabase URL and Key must be set in environment variables")
 
-supabase: Client = create_client(url, key)
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "64"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+# Per-user views are cheap to rebuild, so they only live as long as a typical access token
+USER_CLIENT_TTL = float(os.getenv("SUPABASE_USER_CLIENT_TTL", "300"))
+USER_CLIENT_CACHE_SIZE = int(os.getenv("SUPABASE_USER_CLIENT_CACHE_SIZE", "256"))
+
+
+class ClientRegistry:
+    """One pooled HTTP transport shared by every Supabase caller in the process.
+
+    `client` is the service client; `for_user` returns a PostgREST view that
+    sends the user's access token (so RLS applies) over the same connections.
+    """
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self.http = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            timeout=SUPABASE_TIMEOUT,
+            limits=httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS, max_keepalive_connections=SUPABASE_MAX_CONNECTIONS),
+        )
+        self.client: Client = create_client(url, key, options=SyncClientOptions(httpx_client=self.http))
+        self._user_clients = TTLCache(ttl=USER_CLIENT_TTL, maxsize=USER_CLIENT_CACHE_SIZE)
+
+    def for_user(self, access_token: str) -> SyncPostgrestClient:
+        """Table/RPC access as the given user; no session setup or new connections."""
+        view = self._user_clients.get(access_token)
+        if view is None:
+            view = SyncPostgrestClient(
+                f"{self.url.rstrip('/')}/rest/v1",
+                headers={"apiKey": self.key, "Authorization": f"Bearer {access_token}"},
+                http_client=self.http,
+            )
+            self._user_clients.set(access_token, view)
+        return view
+
+    def close(self):
+        self._user_clients.clear()
+        self.http.close()
+
 
-def get_supabase_client(access_token: str = None) -> Client:
-    client = create_client(url, key)
-    if access_token:
-        client.auth.set_session(access_token, "dummy_refresh_token")
-    return client
+registry = ClientRegistry(url, key)
+supabase: Client = registry.client
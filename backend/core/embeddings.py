@@ -0,0 +1,98 @@
+import os
+import re
+import asyncio
+import hashlib
+import numpy as np
+from typing import List
+
+# All providers are projected to this size so they fit the memories.embedding column
+EMBEDDING_DIM = 768
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+class EmbeddingClient:
+    """Batched text embeddings.
+
+    "gemini" and "openai" call the hosted models; "local" is a deterministic
+    hashing embedder with no network access, used in tests and when no
+    embedding key is configured.
+    """
+
+    def __init__(self, provider: str = "local"):
+        self.provider = provider
+        if provider == "gemini":
+            self.api_key = os.getenv("GEMINI_API_KEY")
+            self.model = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+        elif provider == "openai":
+            self.api_key = os.getenv("OPENAI_API_KEY")
+            self.model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        else:
+            self.provider = "local"
+            self.api_key = None
+            self.model = "local-hashing"
+
+        if self.provider != "local" and not self.api_key:
+            print(f"Warning: no API key for {provider} embeddings, using local embedder")
+            self.provider = "local"
+            self.model = "local-hashing"
+
+    async def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        """Returns a (len(texts), EMBEDDING_DIM) float32 array of unit vectors.
+
+        `task` is "document" for stored text and "query" for search text. Provider
+        errors are raised: vectors from another model aren't comparable with the
+        stored ones, so there is no silent fallback.
+        """
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        if self.provider == "gemini":
+            vectors = await self._embed_gemini(texts, task)
+        elif self.provider == "openai":
+            vectors = await self._embed_openai(texts)
+        else:
+            vectors = self._embed_local(texts)
+
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+    async def _embed_gemini(self, texts: List[str], task: str) -> List[List[float]]:
+        import google.generativeai as genai
+        genai.configure(api_key=self.api_key)
+        # embed_content accepts a list and returns one embedding per item in a single call
+        task_type = "retrieval_query" if task == "query" else "retrieval_document"
+        result = await asyncio.to_thread(genai.embed_content, model=self.model, content=texts, task_type=task_type)
+        return result["embedding"]
+
+    async def _embed_openai(self, texts: List[str]) -> List[List[float]]:
+        from openai import AsyncOpenAI
+        if not hasattr(self, "_client"):
+            self._client = AsyncOpenAI(api_key=self.api_key)
+        response = await self._client.embeddings.create(model=self.model, input=texts, dimensions=EMBEDDING_DIM)
+        return [item.embedding for item in response.data]
+
+    @staticmethod
+    def _embed_local(texts: List[str]) -> np.ndarray:
+        # Feature hashing of unigrams and bigrams with signed buckets
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % EMBEDDING_DIM] += 1.0 if (digest >> 63) else -1.0
+        return vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _default_provider() -> str:
+    provider = os.getenv("EMBEDDING_PROVIDER") or os.getenv("LLM_PROVIDER", "gemini")
+    return provider if provider in ("gemini", "openai") else "local"
+
+
+embedding_client = EmbeddingClient(provider=_default_provider())
@@ -0,0 +1,111 @@
+import io
+import os
+import base64
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+
+from backend.core.cache import TTLCache
+from backend.core.attachments import get_worker_pool, attachment_digest
+
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+# (longest side, shortest side) beyond which a provider downsamples anyway,
+# so sending more pixels only costs upload time. None means no cap.
+PROVIDER_IMAGE_LIMITS = {
+    "gemini": (int(os.getenv("GEMINI_IMAGE_MAX_SIDE", "3072")), None),
+    "openai": (int(os.getenv("OPENAI_IMAGE_MAX_SIDE", "2048")), int(os.getenv("OPENAI_IMAGE_MAX_SHORT_SIDE", "768"))),
+    "pipeshift": (int(os.getenv("PIPESHIFT_IMAGE_MAX_SIDE", "1568")), None),
+}
+
+_processed_cache = TTLCache(ttl=float(os.getenv("ATTACHMENT_CACHE_TTL", "3600")), maxsize=128)
+
+# Cache marker for images that are already small enough to send untouched
+_UNCHANGED = object()
+
+
+def _preprocess_in_worker(source: Any, from_path: bool, max_side: int, max_short_side: Optional[int], quality: int) -> Optional[Tuple[bytes, str]]:
+    """Runs in a worker process. Returns (bytes, mime), or None to keep the original as-is."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    if from_path:
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        data = base64.b64decode(source)
+
+    image = Image.open(io.BytesIO(data))
+    has_exif = bool(image.info.get("exif"))
+    # Bake the EXIF orientation into the pixels before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height))
+    if max_short_side:
+        scale = min(scale, max_short_side / min(width, height))
+
+    if scale >= 1.0 and not has_exif:
+        return None
+
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+    out = io.BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image.save(out, format="WEBP", quality=quality)
+        mime = "image/webp"
+    else:
+        image.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True)
+        mime = "image/jpeg"
+
+    # Re-encoded even when it comes out larger: the original still carries its EXIF (GPS etc.)
+    return out.getvalue(), mime
+
+
+async def preprocess_image(att: Dict[str, Any], provider: str) -> Dict[str, Any]:
+    """Downscaled, EXIF-free copy of an image attachment sized for the provider."""
+    max_side, max_short_side = PROVIDER_IMAGE_LIMITS.get(provider, PROVIDER_IMAGE_LIMITS["gemini"])
+    key = (attachment_digest(att), max_side, max_short_side)
+    cached = _processed_cache.get(key)
+    if cached is _UNCHANGED:
+        return att
+    if cached is not None:
+        return cached
+
+    if "ref" in att:
+        from backend.core.attachment_store import attachment_store
+        source, from_path = attachment_store.path(att["ref"]), True
+    else:
+        source, from_path = att["data"], False
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(get_worker_pool(), _preprocess_in_worker, source, from_path, max_side, max_short_side, IMAGE_JPEG_QUALITY)
+    except Exception as e:
+        print(f"Failed to preprocess image {att.get('name', 'file')}: {e}")
+        result = None
+
+    if result is None:
+        _processed_cache.set(key, _UNCHANGED)
+        return att
+
+    data, mime = result
+    processed = {"type": mime, "name": att.get("name", "image"), "bytes": data, "sha256": key[0]}
+    _processed_cache.set(key, processed)
+    return processed
+
+
+async def preprocess_images(attachments: Optional[List[Dict[str, Any]]], provider: str) -> Optional[List[Dict[str, Any]]]:
+    if not attachments or not IMAGE_PREPROCESS_ENABLED:
+        return attachments
+
+    async def process(att: Dict[str, Any]) -> Dict[str, Any]:
+        if att.get("type", "").startswith("image/") and ("data" in att or "ref" in att):
+            return await preprocess_image(att, provider)
+        return att
+
+    return list(await asyncio.gather(*(process(att) for att in attachments)))
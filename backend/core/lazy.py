@@ -0,0 +1,51 @@
+import time
+import importlib
+import threading
+from typing import Any, Callable, Dict
+
+# Set when this module is first imported, which main.py does before anything heavy
+PROCESS_STARTED = time.perf_counter()
+
+
+class ComponentRegistry:
+    """Named singletons built on first use, so a new worker only pays for what it serves.
+
+    Each factory runs at most once; its construction time is recorded for /metrics.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.ready_seconds = None
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def register_import(self, name: str, module: str, attribute: str):
+        """Registers an object that lives at module.attribute, imported on first use."""
+        self.register(name, lambda: getattr(importlib.import_module(module), attribute))
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._load_seconds[name] = round(time.perf_counter() - started, 4)
+            return self._instances[name]
+
+    def loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def mark_ready(self):
+        self.ready_seconds = round(time.perf_counter() - PROCESS_STARTED, 4)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready_seconds": self.ready_seconds, "loaded": dict(self._load_seconds)}
+
+
+components = ComponentRegistry()
@@ -1,125 +1,148 @@
 import os
-import google.generativeai as genai
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+import asyncio
+from contextlib import aclosing
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Type, TypeVar
+from backend.core.llm_cache import llm_cache
+from backend.core.providers import ProviderRouter, PROVIDER_MODELS
+from backend.core.lazy import components
+from backend.core.tokens import token_meter, max_tokens_for, estimate_tokens
+from backend.core.structured import JSONStreamParser, parse_model
+
+T = TypeVar("T", bound=BaseModel)
+
+# Max number of completions in flight per worker; extra callers wait on the semaphore
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
 
 class LLMClient:
+    """Cached completions on top of a ProviderRouter (failover and optional hedging across providers)."""
+
     def __init__(self, provider: str = "gemini"):
         self.provider = provider
-        self.api_key = os.getenv("GEMINI_API_KEY") if provider == "gemini" else os.getenv("OPENAI_API_KEY")
-        
-        if self.provider == "gemini":
-            if not self.api_key:
-                print("Warning: GEMINI_API_KEY not found")
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash') # Updated to 1.5 Flash for better multimodal
-        elif self.provider == "openai":
-            if not self.api_key:
-                print("Warning: OPENAI_API_KEY not found")
-            self.client = OpenAI(api_key=self.api_key)
-        elif self.provider == "pipeshift":
-            self.api_key = os.getenv("PIPESHIFT_API_KEY")
-            base_url = os.getenv("PIPESHIFT_BASE_URL", "https://api.pipeshift.com/api/v0/")
-            if not self.api_key:
-                print("Warning: PIPESHIFT_API_KEY not found")
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=base_url
-            )
-        
-    async def generate_response(self, prompt: str, system_instruction: Optional[str] = None, attachments: Optional[List[Dict[str, str]]] = None) -> str:
-        if self.provider == "gemini":
-            # Prepare content parts
-            parts = []
-            
-            # Add system instruction as text first (if needed, though system_instruction param is better in newer API, we stick to prompt for now)
-            if system_instruction:
-                parts.append(f"System Instruction: {system_instruction}")
-            
-            parts.append(prompt)
-            
-            # Handle attachments
-            if attachments:
-                for att in attachments:
-                    # att = {"type": "image/png", "data": "base64..."}
-                    if "data" in att:
-                        parts.append({
-                            "mime_type": att.get("type", "image/jpeg"),
-                            "data": att["data"]
-                        })
-            
-            try:
-                response = self.model.generate_content(parts)
-                return response.text
-            except Exception as e:
-                return f"Error generating response from Gemini: {str(e)}"
-                
-        elif self.provider == "openai" or self.provider == "pipeshift":
-            messages = []
-            if system_instruction:
-                messages.append({"role": "system", "content": system_instruction})
-            
-            user_content = [{"type": "text", "text": prompt}]
-            
-            if attachments:
-                for att in attachments:
-                    # OpenAI/PipeShift expects data URI for images
-                    if "data" in att:
-                        mime = att.get("type", "application/octet-stream")
-                        
-                        if mime.startswith("image/"):
-                            data_uri = f"data:{mime};base64,{att['data']}"
-                            user_content.append({
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": data_uri
-                                }
-                            })
-                        elif mime.startswith("text/") or mime == "application/json":
-                            try:
-                                import base64
-                                decoded_text = base64.b64decode(att['data']).decode('utf-8')
-                                user_content[0]["text"] += f"\n\n[Attached File: {att.get('name', 'file')}]\n{decoded_text}"
-                            except Exception as e:
-                                print(f"Failed to decode text attachment: {e}")
-                        elif mime == "application/pdf":
-                            try:
-                                import base64
-                                import io
-                                from pypdf import PdfReader
-                                
-                                decoded_bytes = base64.b64decode(att['data'])
-                                pdf_file = io.BytesIO(decoded_bytes)
-                                reader = PdfReader(pdf_file)
-                                text = ""
-                                for page in reader.pages:
-                                    text += page.extract_text() + "\n"
-                                
-                                user_content[0]["text"] += f"\n\n[Attached PDF: {att.get('name', 'file')}]\n{text}"
-                            except Exception as e:
-                                print(f"Failed to read PDF: {e}")
-                                user_content[0]["text"] += f"\n\n[Attached PDF: {att.get('name', 'file')} - Error reading content]"
-                        else:
-                            # For other types, we might need specific handling.
-                            # For now, just note it.
-                            user_content[0]["text"] += f"\n\n[Attached File: {att.get('name', 'file')} ({mime}) - Content not extracted]"
-
-            messages.append({"role": "user", "content": user_content})
-            
-            model_name = "gpt-4o" if self.provider == "openai" else "neysa-qwen3-vl-30b-a3b"
-            
-            try:
-                response = self.client.chat.completions.create(
-                    model=model_name,
-                    messages=messages,
-                    max_tokens=5000,
-                    temperature=0.6
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                return f"Error generating response from {self.provider}: {str(e)}"
-        
-        return "Invalid provider specified."
-
-# Singleton instance
-llm_client = LLMClient(provider=os.getenv("LLM_PROVIDER", "gemini"))
+        self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self.router = ProviderRouter(provider, self._semaphore, LLM_MAX_CONCURRENCY) if provider in PROVIDER_MODELS else None
+
+    async def aclose(self):
+        if self.router:
+            await self.router.aclose()
+
+    @property
+    def model_name(self) -> str:
+        return PROVIDER_MODELS.get(self.provider, "")
+
+    def _error_message(self, e: Exception) -> str:
+        name = "Gemini" if self.provider == "gemini" else self.provider
+        return f"Error generating response from {name}: {str(e)}"
+
+    @staticmethod
+    def _tracked(answered: List[str], call):
+        """Wraps a streaming call so `answered` ends up naming the provider whose chunks were used."""
+        async def tracked(provider):
+            async for chunk in call(provider):
+                if not answered:
+                    answered.append(provider.name)
+                yield chunk
+        return tracked
+
+    async def generate_response(self, prompt: str, system_instruction: Optional[str] = None, attachments: Optional[List[Dict[str, str]]] = None, cache: bool = True, agent: Optional[str] = None) -> str:
+        """Returns the completion text; pass cache=False for replies that must never be reused.
+
+        `agent` selects the output token limit and the /metrics bucket the call is counted in.
+        """
+        if not self.router:
+            return "Invalid provider specified."
+
+        key = llm_cache.make_key(self.provider, self.model_name, system_instruction, prompt, attachments) if cache else None
+        if key:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return cached
+
+        max_tokens = max_tokens_for(agent)
+
+        async def call(provider):
+            return provider.name, await provider.generate(prompt, system_instruction, attachments, max_tokens)
+
+        try:
+            answered_by, text = await self.router.generate(call)
+        except Exception as e:
+            return self._error_message(e)
+        token_meter.record(agent, estimate_tokens(system_instruction) + estimate_tokens(prompt), estimate_tokens(text))
+
+        # Keys name the primary provider, so replies from a fallback aren't cached under them
+        if key and answered_by == self.provider:
+            await llm_cache.set(key, text)
+        return text
+
+    async def stream_response(self, prompt: str, system_instruction: Optional[str] = None, attachments: Optional[List[Dict[str, str]]] = None, cache: bool = True, agent: Optional[str] = None) -> AsyncIterator[str]:
+        """Yields text chunks as the provider produces them."""
+        if not self.router:
+            yield "Invalid provider specified."
+            return
+
+        key = llm_cache.make_key(self.provider, self.model_name, system_instruction, prompt, attachments) if cache else None
+        if key:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        answered = []
+        max_tokens = max_tokens_for(agent)
+        try:
+            async for chunk in self.router.stream(self._tracked(answered, lambda provider: provider.stream(prompt, system_instruction, attachments, max_tokens))):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield self._error_message(e)
+            return
+
+        text = "".join(chunks)
+        token_meter.record(agent, estimate_tokens(system_instruction) + estimate_tokens(prompt), estimate_tokens(text))
+        if key and answered == [self.provider]:
+            await llm_cache.set(key, text)
+
+    async def generate_structured(self, prompt: str, schema: Type[T], system_instruction: Optional[str] = None, attachments: Optional[List[Dict[str, str]]] = None, cache: bool = True, agent: Optional[str] = None) -> Tuple[Optional[T], str]:
+        """Asks for JSON (natively where the provider supports it) and validates it against `schema`.
+
+        The reply is streamed and parsed as it arrives; reading stops at the end of the
+        first complete object. Returns (parsed or None, raw text).
+        """
+        if not self.router:
+            return None, "Invalid provider specified."
+
+        key = llm_cache.make_key(self.provider, self.model_name, f"json:{system_instruction or ''}", prompt, attachments) if cache else None
+        if key:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return parse_model(cached, schema), cached
+
+        max_tokens = max_tokens_for(agent)
+        parser = JSONStreamParser()
+        chunks = []
+        answered = []
+        try:
+            stream = self.router.stream(self._tracked(answered, lambda provider: provider.stream(prompt, system_instruction, attachments, max_tokens, json_mode=True)))
+            async with aclosing(stream):
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if parser.feed(chunk) is not None:
+                        break
+        except Exception as e:
+            return None, self._error_message(e)
+
+        text = parser.result or "".join(chunks)
+        token_meter.record(agent, estimate_tokens(system_instruction) + estimate_tokens(prompt), estimate_tokens(text))
+        parsed = parse_model(text, schema)
+        if key and parsed is not None and answered == [self.provider]:
+            await llm_cache.set(key, text)
+        return parsed, text
+
+# Singleton instance, built on first `from backend.core.llm import llm_client`
+components.register("llm_client", lambda: LLMClient(provider=os.getenv("LLM_PROVIDER", "gemini")))
+
+def __getattr__(name: str):
+    if name == "llm_client":
+        return components.get("llm_client")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
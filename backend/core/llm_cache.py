@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+
+from backend.core.cache import TTLCache
+from backend.core.attachments import attachment_digest
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class SQLiteResponseStore:
+    """Optional on-disk tier so cached completions survive restarts and are shared across workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("create table if not exists llm_cache (key text primary key, value text not null, expires_at real not null)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("select value, expires_at from llm_cache where key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._conn.execute("insert or replace into llm_cache (key, value, expires_at) values (?, ?, ?)", (key, value, time.time() + ttl))
+            self._conn.execute("delete from llm_cache where expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+
+class LLMResponseCache:
+    """Exact-match completion cache: in-memory LRU with TTL, optionally backed by SQLite."""
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, maxsize: int = LLM_CACHE_SIZE, sqlite_path: Optional[str] = LLM_CACHE_SQLITE_PATH, enabled: bool = LLM_CACHE_ENABLED):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = TTLCache(ttl=ttl, maxsize=maxsize)
+        self.disk = SQLiteResponseStore(sqlite_path) if sqlite_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_instruction: Optional[str], prompt: str, attachments: Optional[List[Dict[str, Any]]] = None) -> str:
+        # Only whitespace is normalized: replies often echo the user's wording (names, titles),
+        # so prompts differing in case must not share an answer. There is deliberately no
+        # similarity-based tier either; near-duplicate prompts can need different replies,
+        # and a wrong cached answer is worse than a miss.
+        normalized_prompt = _WHITESPACE_RE.sub(" ", prompt).strip()
+        parts = [
+            provider,
+            model,
+            hashlib.sha256((system_instruction or "").encode()).hexdigest(),
+            normalized_prompt,
+            [attachment_digest(att) for att in attachments or []],
+        ]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.disk:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        if not self.enabled or not value:
+            return
+        self.memory.set(key, value)
+        if self.disk:
+            await asyncio.to_thread(self.disk.set, key, value, self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": len(self.memory),
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,80 @@
+import os
+from typing import List, Dict, Any, Optional, Iterable
+from backend.core.cache import TTLCache
+
+MEMBER_CACHE_TTL = float(os.getenv("MEMBER_CACHE_TTL", "300"))
+
+MEMBER_COLUMNS = "id, full_name, family_id, profile_data"
+
+FAMILY_MEMBER = {"name": "Family", "color": "bg-purple-500"}
+
+
+def member_info(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Name/color block the frontend shows next to a schedule item."""
+    if not profile:
+        return dict(FAMILY_MEMBER)
+    color = "bg-blue-500"
+    if profile.get("profile_data") and isinstance(profile["profile_data"], dict):
+        color = profile["profile_data"].get("color", "bg-blue-500")
+    return {
+        "name": profile.get("full_name") or "Unknown",
+        "color": color
+    }
+
+
+class MemberCache:
+    """In-process cache of family member profiles keyed by profile id."""
+
+    def __init__(self, ttl: float = MEMBER_CACHE_TTL):
+        self._members = TTLCache(ttl=ttl, maxsize=4096)
+        self._families = TTLCache(ttl=ttl)
+
+    def prime(self, profiles: Iterable[Dict[str, Any]]):
+        for profile in profiles:
+            if profile.get("id"):
+                self._members.set(profile["id"], profile)
+
+    async def get_many(self, profile_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        from backend.core.repository import repository
+
+        found = {}
+        missing = []
+        for profile_id in set(filter(None, profile_ids)):
+            profile = self._members.get(profile_id)
+            if profile is None:
+                missing.append(profile_id)
+            else:
+                found[profile_id] = profile
+
+        if missing:
+            # One query for every id we haven't seen yet
+            profiles = await repository.get_profiles(missing, MEMBER_COLUMNS)
+            self.prime(profiles)
+            found.update({p["id"]: p for p in profiles})
+        return found
+
+    async def get(self, profile_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not profile_id:
+            return None
+        return (await self.get_many([profile_id])).get(profile_id)
+
+    async def family_members(self, family_id: str) -> List[Dict[str, Any]]:
+        members = self._families.get(family_id)
+        if members is None:
+            from backend.core.repository import repository
+            members = await repository.list_family_members(family_id, MEMBER_COLUMNS)
+            self._families.set(family_id, members)
+            self.prime(members)
+        return members
+
+    def invalidate(self, profile_id: Optional[str] = None, family_id: Optional[str] = None):
+        if profile_id:
+            cached = self._members.get(profile_id)
+            self._members.invalidate(profile_id)
+            if cached and cached.get("family_id"):
+                self._families.invalidate(cached["family_id"])
+        if family_id:
+            self._families.invalidate(family_id)
+
+
+member_cache = MemberCache()
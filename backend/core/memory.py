@@ -1,57 +1,130 @@
 import os
-from supabase import create_client, Client
-from typing import List, Dict, Any
+from supabase import Client
+from typing import List, Dict, Any, Optional, Tuple
+
+from backend.core.embeddings import embedding_client
+from backend.core.vector_index import LocalVectorIndex
+from backend.core.lazy import components
+
+# Hashed local embeddings score lower than hosted models for the same match
+DEFAULT_MATCH_THRESHOLDS = {"local": 0.2}
 
 class MemoryManager:
     def __init__(self):
-        url: str = os.environ.get("SUPABASE_URL")
-        key: str = os.environ.get("SUPABASE_KEY")
-        if not url or not key:
+        # Shares the process-wide Supabase client (and its connection pool)
+        try:
+            from backend.core.database import supabase
+            from backend.core.repository import repository
+            self.supabase: Client = supabase
+            self.repository = repository
+        except ValueError:
             print("Warning: SUPABASE_URL or SUPABASE_KEY not found")
             self.supabase: Client = None
-        else:
-            self.supabase: Client = create_client(url, key)
 
-    async def add_memory(self, user_id: str, content: str, metadata: Dict[str, Any] = {}):
+        self.embedder = embedding_client
+        self.match_threshold = float(os.getenv("MEMORY_MATCH_THRESHOLD") or DEFAULT_MATCH_THRESHOLDS.get(self.embedder.provider, 0.5))
+        # Serves queries only when Supabase is unavailable (tests, local runs)
+        self.local_index = LocalVectorIndex() if not self.supabase else None
+        # Rows stored without an embedding (provider failures) are re-embedded after the
+        # next successful call; True at startup to pick up rows left by earlier runs
+        self._reembed_pending = True
+
+    async def add_memory(self, user_id: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        await self.add_memories(user_id, [(content, metadata or {})])
+
+    async def add_memories(self, user_id: str, items: List[Tuple[str, Dict[str, Any]]]):
+        """Embeds a batch of (content, metadata) pairs in one call and stores them together."""
+        await self.add_entries([(user_id, content, metadata) for content, metadata in items])
+
+    async def add_entries(self, entries: List[Tuple[str, str, Dict[str, Any]]]):
+        """Like add_memories, but for (user_id, content, metadata) entries from any number of users."""
+        if not entries:
+            return
+
+        try:
+            embeddings = await self.embedder.embed([content for _, content, _ in entries])
+        except Exception as e:
+            # Stored without a vector and re-embedded later; never mixed with another model's vectors
+            print(f"Error generating embeddings with {self.embedder.provider}: {e}")
+            embeddings = None
+            self._reembed_pending = True
+
+        rows = [
+            {
+                "user_id": user_id,
+                "content": content,
+                "metadata": metadata,
+                "embedding": embeddings[i].tolist() if embeddings is not None else None
+            }
+            for i, (user_id, content, metadata) in enumerate(entries)
+        ]
+
         if not self.supabase:
+            if embeddings is None:
+                return
+            by_user: Dict[str, List[int]] = {}
+            for i, row in enumerate(rows):
+                by_user.setdefault(row["user_id"], []).append(i)
+            for user_id, indices in by_user.items():
+                self.local_index.add(user_id, embeddings[indices], [{k: v for k, v in rows[i].items() if k != "embedding"} for i in indices])
             return
-        
-        # TODO: Generate embedding for content
-        # embedding = generate_embedding(content)
-        
-        data = {
-            "user_id": user_id,
-            "content": content,
-            "metadata": metadata,
-            # "embedding": embedding
-        }
-        
+
         try:
-            self.supabase.table("memories").insert(data).execute()
+            await self.repository.insert_memories(rows)
         except Exception as e:
             print(f"Error adding memory: {str(e)}")
 
+        if embeddings is not None and self._reembed_pending:
+            await self.reembed_pending()
+
+    async def reembed_pending(self, batch_size: int = 50):
+        """Embeds stored memories that were written without a vector."""
+        self._reembed_pending = False
+        try:
+            rows = await self.repository.memories_missing_embedding(batch_size)
+            if not rows:
+                return
+            embeddings = await self.embedder.embed([row["content"] for row in rows])
+            for row, embedding in zip(rows, embeddings):
+                await self.repository.set_memory_embedding(row["id"], embedding.tolist())
+            # A full batch may mean more are waiting
+            self._reembed_pending = len(rows) == batch_size
+        except Exception as e:
+            print(f"Error re-embedding memories: {str(e)}")
+            self._reembed_pending = True
+
     async def query_memory(self, user_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        try:
+            query_embedding = (await self.embedder.embed([query], task="query"))[0]
+        except Exception as e:
+            print(f"Error embedding memory query: {str(e)}")
+            query_embedding = None
+
         if not self.supabase:
-            return []
-            
-        # TODO: Generate embedding for query
-        # query_embedding = generate_embedding(query)
-        
-        # Placeholder for vector search
-        # response = self.supabase.rpc("match_memories", {
-        #     "query_embedding": query_embedding,
-        #     "match_threshold": 0.7,
-        #     "match_count": limit,
-        #     "p_user_id": user_id
-        # }).execute()
-        
-        # For now, just return recent memories
+            if query_embedding is None:
+                return []
+            matches = self.local_index.search(user_id, query_embedding, k=limit, threshold=self.match_threshold)
+            return [{**row, "similarity": score} for score, row in matches]
+
+        if query_embedding is not None:
+            try:
+                matches = await self.repository.match_memories(user_id, query_embedding.tolist(), self.match_threshold, limit)
+                if matches:
+                    return matches
+            except Exception as e:
+                print(f"Error querying memory: {str(e)}")
+
+        # No match (or no vector search): fall back to the most recent memories
         try:
-            response = self.supabase.table("memories").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
-            return response.data
+            return await self.repository.recent_memories(user_id, limit)
         except Exception as e:
             print(f"Error querying memory: {str(e)}")
             return []
 
-memory_manager = MemoryManager()
+components.register("memory_manager", MemoryManager)
+
+def __getattr__(name: str):
+    if name == "memory_manager":
+        return components.get("memory_manager")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
@@ -0,0 +1,81 @@
+import os
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+
+MEMORY_QUEUE_SIZE = int(os.getenv("MEMORY_QUEUE_SIZE", "1000"))
+MEMORY_BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "50"))
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "2.0"))
+
+
+class MemoryWriteBehind:
+    """Background pipeline that persists chat turns off the response path.
+
+    Requests enqueue without awaiting any I/O; a single worker task drains the
+    queue and writes batches through MemoryManager.add_entries whenever
+    `batch_size` entries are waiting or `flush_interval` seconds have passed.
+    """
+
+    def __init__(self, maxsize: int = MEMORY_QUEUE_SIZE, batch_size: int = MEMORY_BATCH_SIZE, flush_interval: float = MEMORY_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def enqueue(self, user_id: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        try:
+            self._queue.put_nowait((user_id, content, metadata or {}))
+            return True
+        except asyncio.QueueFull:
+            # Never make the caller wait on persistence; losing a turn beats adding latency
+            self.dropped += 1
+            print(f"Warning: memory queue full, dropped entry for user {user_id}")
+            return False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued, then stops the worker."""
+        if self._task and not self._task.done():
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        if not batch:
+            return
+        from backend.core.memory import memory_manager
+        try:
+            await memory_manager.add_entries(batch)
+        except Exception as e:
+            print(f"Error flushing {len(batch)} memories: {e}")
+
+
+_STOP = object()
+
+memory_writer = MemoryWriteBehind()
@@ -0,0 +1,395 @@
+import os
+import time
+import asyncio
+import httpx
+from collections import deque
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Awaitable
+
+from backend.core.attachments import describe_attachments, has_content, attachment_bytes, attachment_base64
+from backend.core.images import preprocess_images
+
+# Per-provider request timeouts in seconds
+PROVIDER_TIMEOUTS = {
+    "gemini": float(os.getenv("GEMINI_TIMEOUT", "60")),
+    "openai": float(os.getenv("OPENAI_TIMEOUT", "60")),
+    "pipeshift": float(os.getenv("PIPESHIFT_TIMEOUT", "90")),
+}
+
+PROVIDER_MODELS = {
+    "gemini": "gemini-1.5-flash",
+    "openai": "gpt-4o",
+    "pipeshift": "neysa-qwen3-vl-30b-a3b",
+}
+
+PROVIDER_KEY_VARS = {
+    "gemini": "GEMINI_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "pipeshift": "PIPESHIFT_API_KEY",
+}
+
+# Comma-separated failover order after LLM_PROVIDER; "auto" = every other provider with an API key, "none" = no failover
+LLM_FALLBACK_PROVIDERS = os.getenv("LLM_FALLBACK_PROVIDERS", "auto")
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "100"))
+# A provider whose recent error rate reaches this is tried last until it has been quiet for the cooldown
+LLM_UNHEALTHY_ERROR_RATE = float(os.getenv("LLM_UNHEALTHY_ERROR_RATE", "0.5"))
+LLM_UNHEALTHY_COOLDOWN = float(os.getenv("LLM_UNHEALTHY_COOLDOWN", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+
+
+class ProviderStats:
+    """Rolling latency and error window for one provider."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.last_error_at = 0.0
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+            self.last_error_at = time.monotonic()
+
+    def record_cancelled(self, elapsed: float):
+        """A call cancelled after `elapsed` seconds (it lost a hedge race).
+
+        Its real latency is at least `elapsed`. Only calls that already ran past the
+        p95 are kept as samples; dropping them would pull the p95, and with it the
+        hedge delay, down over time. Calls cut off sooner say nothing about the tail.
+        """
+        p95 = self.p95()
+        if p95 is not None and elapsed >= p95:
+            self.latencies.append(elapsed)
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def healthy(self) -> bool:
+        if self.error_rate() < LLM_UNHEALTHY_ERROR_RATE:
+            return True
+        return time.monotonic() - self.last_error_at > LLM_UNHEALTHY_COOLDOWN
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "hedges": self.hedges,
+            "healthy": self.healthy(),
+        }
+
+
+class Provider:
+    def __init__(self, name: str, semaphore: asyncio.Semaphore):
+        self.name = name
+        self.model_name = PROVIDER_MODELS[name]
+        self.timeout = PROVIDER_TIMEOUTS.get(name, 60.0)
+        self.api_key = os.getenv(PROVIDER_KEY_VARS[name])
+        self.stats = ProviderStats()
+        self._semaphore = semaphore
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    async def generate(self, prompt: str, system_instruction: Optional[str], attachments: Optional[List[Dict[str, str]]], max_tokens: int, json_mode: bool = False) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, system_instruction: Optional[str], attachments: Optional[List[Dict[str, str]]], max_tokens: int, json_mode: bool = False) -> AsyncIterator[str]:
+        """json_mode asks the provider to emit a single JSON object, where it supports that natively."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class GeminiProvider(Provider):
+    def __init__(self, semaphore: asyncio.Semaphore):
+        super().__init__("gemini", semaphore)
+        self._model = None
+
+    @property
+    def model(self):
+        # The SDK is imported the first time this provider is actually called
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def _build_parts(self, prompt: str, system_instruction: Optional[str], attachments: Optional[List[Dict[str, str]]]) -> List[Any]:
+        attachments = await preprocess_images(attachments, self.name)
+
+        # Prepare content parts
+        parts = []
+
+        # Add system instruction as text first (if needed, though system_instruction param is better in newer API, we stick to prompt for now)
+        if system_instruction:
+            parts.append(f"System Instruction: {system_instruction}")
+
+        parts.append(prompt)
+
+        # Handle attachments
+        if attachments:
+            for att in attachments:
+                # att = {"type": "image/png", "data": "base64..."} or an uploaded {"type": ..., "ref": id}
+                if "data" in att:
+                    parts.append({
+                        "mime_type": att.get("type", "image/jpeg"),
+                        "data": att["data"]
+                    })
+                elif has_content(att):
+                    # Gemini takes raw bytes, so stored and preprocessed uploads are never base64-encoded
+                    parts.append({
+                        "mime_type": att.get("type", "image/jpeg"),
+                        "data": await attachment_bytes(att)
+                    })
+        return parts
+
+    def _generation_config(self, max_tokens: int, json_mode: bool) -> Dict[str, Any]:
+        config = {"max_output_tokens": max_tokens}
+        if json_mode:
+            config["response_mime_type"] = "application/json"
+        return config
+
+    async def generate(self, prompt, system_instruction, attachments, max_tokens, json_mode=False) -> str:
+        parts = await self._build_parts(prompt, system_instruction, attachments)
+        async with self._semaphore:
+            response = await self.model.generate_content_async(parts, generation_config=self._generation_config(max_tokens, json_mode), request_options={"timeout": self.timeout})
+        return response.text
+
+    async def stream(self, prompt, system_instruction, attachments, max_tokens, json_mode=False) -> AsyncIterator[str]:
+        parts = await self._build_parts(prompt, system_instruction, attachments)
+        async with self._semaphore:
+            response = await self.model.generate_content_async(parts, stream=True, generation_config=self._generation_config(max_tokens, json_mode), request_options={"timeout": self.timeout})
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+
+
+class OpenAICompatibleProvider(Provider):
+    """OpenAI, and Pipeshift through its OpenAI-compatible endpoint."""
+
+    def __init__(self, name: str, semaphore: asyncio.Semaphore, max_connections: int, base_url: Optional[str] = None):
+        super().__init__(name, semaphore)
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # One pooled keep-alive connection set shared by every completion on this worker
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=self.timeout
+            )
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, http_client=http_client)
+        return self._client
+
+    async def _build_messages(self, prompt: str, system_instruction: Optional[str], attachments: Optional[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+        attachments = await preprocess_images(attachments, self.name)
+
+        messages = []
+        if system_instruction:
+            messages.append({"role": "system", "content": system_instruction})
+
+        user_content = [{"type": "text", "text": prompt}]
+
+        # PDFs and text files are decoded and extracted in the attachment worker pool
+        descriptions = await describe_attachments(attachments)
+        for att, description in zip(attachments or [], descriptions):
+            if description:
+                user_content[0]["text"] += f"\n\n{description}"
+            elif has_content(att):
+                # OpenAI/PipeShift expects data URI for images
+                mime = att.get("type", "application/octet-stream")
+                data_uri = f"data:{mime};base64,{await attachment_base64(att)}"
+                user_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": data_uri
+                    }
+                })
+
+        messages.append({"role": "user", "content": user_content})
+        return messages
+
+    def _options(self, max_tokens: int, json_mode: bool) -> Dict[str, Any]:
+        options = {"max_tokens": max_tokens, "temperature": 0.6}
+        # Pipeshift's OpenAI-compatible API doesn't take response_format; it relies on the prompt
+        if json_mode and self.name == "openai":
+            options["response_format"] = {"type": "json_object"}
+        return options
+
+    async def generate(self, prompt, system_instruction, attachments, max_tokens, json_mode=False) -> str:
+        messages = await self._build_messages(prompt, system_instruction, attachments)
+        async with self._semaphore:
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                **self._options(max_tokens, json_mode)
+            )
+        return response.choices[0].message.content
+
+    async def stream(self, prompt, system_instruction, attachments, max_tokens, json_mode=False) -> AsyncIterator[str]:
+        messages = await self._build_messages(prompt, system_instruction, attachments)
+        async with self._semaphore:
+            stream = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                stream=True,
+                **self._options(max_tokens, json_mode)
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Releases the connection when a caller stops reading early
+                await stream.close()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+def build_provider(name: str, semaphore: asyncio.Semaphore, max_connections: int) -> Provider:
+    if name == "gemini":
+        return GeminiProvider(semaphore)
+    if name == "openai":
+        return OpenAICompatibleProvider("openai", semaphore, max_connections)
+    if name == "pipeshift":
+        base_url = os.getenv("PIPESHIFT_BASE_URL", "https://api.pipeshift.com/api/v0/")
+        return OpenAICompatibleProvider("pipeshift", semaphore, max_connections, base_url=base_url)
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+class ProviderRouter:
+    """Sends each completion to the healthiest configured provider.
+
+    Failures fall through to the next provider. With hedging on, a request still
+    running after the provider's p95 latency is raced against the next provider
+    and whichever answers first wins.
+    """
+
+    def __init__(self, primary: str, semaphore: asyncio.Semaphore, max_connections: int, fallbacks: str = LLM_FALLBACK_PROVIDERS, hedge: bool = LLM_HEDGE_ENABLED):
+        self.hedge = hedge
+        self.primary = build_provider(primary, semaphore, max_connections)
+        if not self.primary.available:
+            print(f"Warning: {PROVIDER_KEY_VARS[primary]} not found")
+
+        if fallbacks == "auto":
+            names = [name for name in PROVIDER_MODELS if name != primary and os.getenv(PROVIDER_KEY_VARS[name])]
+        elif fallbacks == "none":
+            names = []
+        else:
+            names = [name.strip() for name in fallbacks.split(",") if name.strip() and name.strip() != primary]
+        self.providers = [self.primary] + [build_provider(name, semaphore, max_connections) for name in names]
+
+    def candidates(self) -> List[Provider]:
+        # The primary is always tried, even without a key, so misconfiguration surfaces as an error
+        usable = [p for p in self.providers if p is self.primary or p.available]
+        # Stable sort: configured order, with providers in their error cooldown moved to the back
+        return sorted(usable, key=lambda p: not p.stats.healthy())
+
+    def hedge_delay(self, provider: Provider) -> Optional[float]:
+        p95 = provider.stats.p95()
+        return max(p95, LLM_HEDGE_MIN_DELAY) if p95 is not None else None
+
+    async def _timed(self, provider: Provider, call: Callable[[Provider], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        try:
+            result = await call(provider)
+        except asyncio.CancelledError:
+            provider.stats.record_cancelled(time.monotonic() - started)
+            raise
+        except Exception:
+            provider.stats.record(False)
+            raise
+        provider.stats.record(True, time.monotonic() - started)
+        return result
+
+    async def generate(self, call: Callable[[Provider], Awaitable[Any]]) -> Any:
+        remaining = self.candidates()
+        last_error: Optional[Exception] = None
+
+        while remaining:
+            provider = remaining.pop(0)
+            delay = self.hedge_delay(provider) if self.hedge and remaining else None
+            first = asyncio.ensure_future(self._timed(provider, call))
+            try:
+                if delay is None:
+                    return await first
+
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if done:
+                    return first.result()
+
+                backup = remaining.pop(0)
+                provider.stats.hedges += 1
+                print(f"[LLM] {provider.name} slower than {delay:.2f}s, hedging with {backup.name}")
+                pending = {first, asyncio.ensure_future(self._timed(backup, call))}
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            for other in pending:
+                                other.cancel()
+                            return task.result()
+                        last_error = task.exception()
+            except Exception as e:
+                last_error = e
+            finally:
+                if not first.done():
+                    first.cancel()
+            print(f"[LLM] {provider.name} failed ({last_error}), trying next provider")
+
+        raise last_error or RuntimeError("No LLM provider available")
+
+    async def stream(self, call: Callable[[Provider], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Fails over only until the first chunk is sent; after that an error ends the stream."""
+        last_error: Optional[Exception] = None
+        for provider in self.candidates():
+            started = False
+            try:
+                async for chunk in call(provider):
+                    started = True
+                    yield chunk
+                provider.stats.record(True)
+                return
+            except GeneratorExit:
+                # The caller stopped reading (e.g. it already has a complete JSON object)
+                provider.stats.record(True)
+                raise
+            except Exception as e:
+                provider.stats.record(False)
+                if started:
+                    raise
+                last_error = e
+                print(f"[LLM] {provider.name} stream failed ({e}), trying next provider")
+        raise last_error or RuntimeError("No LLM provider available")
+
+    def stats(self) -> Dict[str, Any]:
+        return {p.name: p.stats.snapshot() for p in self.providers}
+
+    async def aclose(self):
+        for provider in self.providers:
+            await provider.aclose()
@@ -0,0 +1,236 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+# supabase-py is synchronous, so every query is offloaded to a bounded pool
+# instead of blocking the event loop for the whole PostgREST round trip.
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="supabase")
+
+
+# Top-level profile columns merge_profile_data() sets, and the parameter for each
+MERGE_PROFILE_COLUMNS = {
+    "full_name": "p_full_name",
+    "family_id": "p_family_id",
+    "onboarding_completed": "p_onboarding_completed",
+}
+
+
+class Repository:
+    """Async data-access layer shared by routers, services and agents."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        # The default Supabase client is resolved on first query, not at import
+        if self._client is None:
+            from backend.core.database import supabase
+            self._client = supabase
+        return self._client
+
+    async def execute(self, query):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, query.execute)
+
+    async def rpc(self, fn: str, params: Dict[str, Any]):
+        return await self.execute(self.client.rpc(fn, params))
+
+    # --- profiles ---
+
+    async def get_profile(self, user_id: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("profiles").select(columns).eq("id", user_id))
+        return res.data[0] if res.data else None
+
+    async def get_profiles(self, user_ids: List[str], columns: str = "*") -> List[Dict[str, Any]]:
+        res = await self.execute(self.client.table("profiles").select(columns).in_("id", user_ids))
+        return res.data or []
+
+    async def update_profile(self, user_id: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Plain column update: a given profile_data replaces the stored one (see merge_profile)
+        res = await self.execute(self.client.table("profiles").update(data).eq("id", user_id))
+        return res.data
+
+    async def merge_profile(self, user_id: str, patch: Optional[Dict[str, Any]], columns: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """One round trip `profile_data || patch` (plus top-level columns) via the merge_profile_data RPC.
+
+        Used for agent-extracted updates and PUT /api/profile: null patch values and null
+        columns leave the stored value alone. Columns the RPC doesn't take are written
+        with a plain update.
+        """
+        columns = dict(columns or {})
+        params = {"p_user_id": user_id, "p_patch": patch or {}}
+        for column, param in MERGE_PROFILE_COLUMNS.items():
+            params[param] = columns.pop(column, None)
+        res = await self.rpc("merge_profile_data", params)
+        if columns:
+            return await self.update_profile(user_id, columns)
+        return res.data or []
+
+    async def list_family_members(self, family_id: str, columns: str = "*") -> List[Dict[str, Any]]:
+        res = await self.execute(self.client.table("profiles").select(columns).eq("family_id", family_id))
+        return res.data or []
+
+    # --- families ---
+
+    async def get_family(self, family_id: str) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("families").select("*").eq("id", family_id).single())
+        return res.data
+
+    async def get_family_by_code(self, invite_code: str) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("families").select("*").eq("invite_code", invite_code))
+        return res.data[0] if res.data else None
+
+    async def check_family_code(self, code: str) -> List[Dict[str, Any]]:
+        res = await self.rpc("check_family_code", {"code": code})
+        return res.data or []
+
+    # --- schedules ---
+
+    async def list_schedules(
+        self,
+        family_id: str,
+        date: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        after: Optional[Tuple[str, str, str]] = None,
+        descending: bool = True
+    ) -> List[Dict[str, Any]]:
+        query = self.client.table("schedules").select("*").eq("family_id", family_id)
+        if date:
+            query = query.eq("date", date)
+        if status:
+            query = query.eq("status", status)
+        if date_from:
+            query = query.gte("date", date_from)
+        if date_to:
+            query = query.lte("date", date_to)
+        if after:
+            # Keyset pagination: rows strictly past (date, time, id) in the sort order
+            a_date, a_time, a_id = after
+            op = "lt" if descending else "gt"
+            query = query.or_(
+                f'date.{op}.{a_date},'
+                f'and(date.eq.{a_date},time.{op}."{a_time}"),'
+                f'and(date.eq.{a_date},time.eq."{a_time}",id.{op}.{a_id})'
+            )
+        query = query.order("date", desc=descending).order("time", desc=descending).order("id", desc=descending)
+        if limit:
+            query = query.limit(limit)
+        res = await self.execute(query)
+        return res.data or []
+
+    async def insert_schedule(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("schedules").insert(data))
+        return res.data[0] if res.data else None
+
+    async def update_schedule(self, schedule_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("schedules").update(data).eq("id", schedule_id))
+        return res.data[0] if res.data else None
+
+    # --- inventory ---
+
+    async def list_inventory(self, family_id: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = self.client.table("inventory_items").select("*")
+        if family_id:
+            query = query.eq("family_id", family_id)
+        else:
+            query = query.eq("user_id", user_id)
+        res = await self.execute(query)
+        return res.data or []
+
+    async def insert_inventory_item(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("inventory_items").insert(data))
+        return res.data[0] if res.data else None
+
+    async def update_inventory_item(self, item_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("inventory_items").update(data).eq("id", item_id))
+        return res.data[0] if res.data else None
+
+    async def delete_inventory_item(self, item_id: str) -> Optional[Dict[str, Any]]:
+        res = await self.execute(self.client.table("inventory_items").delete().eq("id", item_id))
+        return res.data[0] if res.data else None
+
+    # --- vitals ---
+
+    async def latest_vitals(self, user_ids: List[str], types: List[str], per_type: int = 2) -> List[Dict[str, Any]]:
+        # rank 1 is the newest reading of each (user, type), rank 2 the one before it
+        res = await self.rpc("latest_vitals", {"p_user_ids": user_ids, "p_types": types, "p_per_type": per_type})
+        return res.data or []
+
+    async def insert_vitals(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        res = await self.execute(self.client.table("vitals").insert(records))
+        return res.data or []
+
+    async def list_vitals(self, user_id: str, vital_type: str, start: str, end: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        # Newest first, so a capped result keeps the end of the window
+        res = await self.execute(
+            self.client.table("vitals").select("recorded_at,value,unit")
+            .eq("user_id", user_id).eq("type", vital_type)
+            .gte("recorded_at", start).lt("recorded_at", end)
+            .order("recorded_at", desc=True).limit(limit)
+        )
+        return res.data or []
+
+    async def list_recent_vitals(self, user_ids: List[str], since: str, limit: int = 20000) -> List[Dict[str, Any]]:
+        res = await self.execute(
+            self.client.table("vitals").select("user_id,type,value,unit,recorded_at")
+            .in_("user_id", user_ids).gte("recorded_at", since)
+            .order("recorded_at", desc=True).limit(limit)
+        )
+        return res.data or []
+
+    async def list_vitals_rollups(self, user_id: str, vital_type: str, resolution: str, start: str, end: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        # Newest first, like list_vitals
+        res = await self.execute(
+            self.client.table("vitals_rollups").select("bucket,count,sum,min,max")
+            .eq("user_id", user_id).eq("type", vital_type).eq("resolution", resolution)
+            .gte("bucket", start).lt("bucket", end)
+            .order("bucket", desc=True).limit(limit)
+        )
+        return res.data or []
+
+    async def upsert_vitals(self, records: List[Dict[str, Any]]) -> int:
+        """Multi-row insert that skips readings already stored for (user_id, type, recorded_at); returns rows written."""
+        if not records:
+            return 0
+        res = await self.execute(
+            self.client.table("vitals").upsert(
+                records, on_conflict="user_id,type,recorded_at", ignore_duplicates=True, returning="minimal", count="exact"
+            )
+        )
+        return res.count if res.count is not None else len(records)
+
+    # --- memories ---
+
+    async def insert_memories(self, rows: List[Dict[str, Any]]):
+        return await self.execute(self.client.table("memories").insert(rows))
+
+    async def memories_missing_embedding(self, limit: int = 50) -> List[Dict[str, Any]]:
+        res = await self.execute(self.client.table("memories").select("id,content").is_("embedding", "null").order("created_at").limit(limit))
+        return res.data or []
+
+    async def set_memory_embedding(self, memory_id: str, embedding: List[float]):
+        return await self.execute(self.client.table("memories").update({"embedding": embedding}).eq("id", memory_id))
+
+    async def match_memories(self, user_id: str, embedding: List[float], threshold: float, limit: int) -> List[Dict[str, Any]]:
+        res = await self.rpc("match_memories", {
+            "query_embedding": embedding,
+            "match_threshold": threshold,
+            "match_count": limit,
+            "p_user_id": user_id
+        })
+        return res.data or []
+
+    async def recent_memories(self, user_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        query = self.client.table("memories").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit)
+        res = await self.execute(query)
+        return res.data or []
+
+
+repository = Repository()
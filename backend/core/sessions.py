@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import sqlite3
+import weakref
+import threading
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+
+from backend.core.cache import TTLCache
+from backend.core.tokens import truncate_text
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_STORE_SQLITE_PATH = os.getenv("SESSION_STORE_SQLITE_PATH")
+# Turns kept verbatim (shortened) in the rolling summary
+SESSION_SUMMARY_TURNS = int(os.getenv("SESSION_SUMMARY_TURNS", "6"))
+
+DEFAULT_SESSION = "default"
+
+
+class SessionState(BaseModel):
+    """Server-side conversation state, so the client only has to send the new message."""
+    user_id: str
+    session_id: str = DEFAULT_SESSION
+    # Profile fields that only live in the conversation (role, suggest_completion, partial profile_data)
+    profile: Dict[str, Any] = {}
+    recent_turns: List[str] = []
+    turns: int = 0
+    # Profile fields an older client echoed on this request; not stored separately
+    client_profile: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+
+    @property
+    def key(self) -> str:
+        return f"{self.user_id}:{self.session_id}"
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.recent_turns)
+
+    def merge_profile(self, fields: Dict[str, Any]):
+        profile_data = {**self.profile.get("profile_data", {}), **(fields.get("profile_data") or {})}
+        self.profile.update({k: v for k, v in fields.items() if k != "profile_data"})
+        if profile_data:
+            self.profile["profile_data"] = profile_data
+
+    def add_turn(self, message: str, response: str):
+        self.turns += 1
+        self.recent_turns.append(f"User: {truncate_text(message, 200)} | Liora: {truncate_text(response, 200)}")
+        self.recent_turns = self.recent_turns[-SESSION_SUMMARY_TURNS:]
+
+
+class MemorySessionBackend:
+    def __init__(self, ttl: float = SESSION_TTL, maxsize: int = SESSION_CACHE_SIZE):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    async def load(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def save(self, key: str, value: str):
+        self._cache.set(key, value)
+
+    async def delete(self, key: str):
+        self._cache.invalidate(key)
+
+
+class SQLiteSessionBackend:
+    """Shares sessions across workers on one host and keeps them across restarts."""
+
+    def __init__(self, path: str, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("create table if not exists sessions (key text primary key, value text not null, expires_at real not null)")
+        self._conn.commit()
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("select value, expires_at from sessions where key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def _save(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("insert or replace into sessions (key, value, expires_at) values (?, ?, ?)", (key, value, time.time() + self.ttl))
+            self._conn.execute("delete from sessions where expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute("delete from sessions where key = ?", (key,))
+            self._conn.commit()
+
+    async def load(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._load, key)
+
+    async def save(self, key: str, value: str):
+        await asyncio.to_thread(self._save, key, value)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+
+class SessionStore:
+    """Conversation sessions keyed by user and session id.
+
+    Any backend with async load/save/delete of string values fits; the in-memory
+    LRU is the default and SQLite is used when SESSION_STORE_SQLITE_PATH is set.
+    """
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = SQLiteSessionBackend(SESSION_STORE_SQLITE_PATH) if SESSION_STORE_SQLITE_PATH else MemorySessionBackend()
+        self.backend = backend
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def get(self, user_id: str, session_id: Optional[str] = None) -> SessionState:
+        state = SessionState(user_id=user_id, session_id=session_id or DEFAULT_SESSION)
+        try:
+            raw = await self.backend.load(state.key)
+            return SessionState.model_validate_json(raw) if raw else state
+        except Exception as e:
+            # A corrupt or unreadable session starts over instead of breaking chat
+            print(f"[Sessions] Failed to load {state.key}: {e}")
+            return state
+
+    async def save(self, state: SessionState):
+        try:
+            await self.backend.save(state.key, state.model_dump_json())
+        except Exception as e:
+            print(f"[Sessions] Failed to save {state.key}: {e}")
+
+    async def record_turn(self, state: SessionState, message: str, response: str, updates: Optional[Dict[str, Any]] = None):
+        """Adds the turn to the rolling summary and keeps conversation-only state from the agent's updates.
+
+        The session is re-read under a per-session lock, so turns recorded by concurrent
+        requests in this worker are applied one after another instead of overwriting each other.
+        """
+        updates = updates or {}
+        fields = {k: updates[k] for k in ("suggest_completion", "onboarding_completed", "profile_data") if k in updates}
+        if "join_family_id" in updates:
+            fields["family_id"] = updates["join_family_id"]
+        async with self._lock(state.key):
+            latest = await self.get(state.user_id, state.session_id)
+            if state.client_profile:
+                latest.merge_profile(state.client_profile)
+            if fields:
+                latest.merge_profile(fields)
+            latest.add_turn(message, response)
+            await self.save(latest)
+
+    async def clear(self, user_id: str, session_id: Optional[str] = None):
+        await self.backend.delete(SessionState(user_id=user_id, session_id=session_id or DEFAULT_SESSION).key)
+
+
+session_store = SessionStore()
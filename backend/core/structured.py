@@ -0,0 +1,146 @@
+import json
+from pydantic import BaseModel, ConfigDict, ValidationError
+from typing import List, Dict, Any, Optional, Type, TypeVar
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class JSONStreamParser:
+    """Finds the first complete top-level JSON object in text that arrives in chunks.
+
+    Braces and `//` inside strings are handled correctly, so URLs and quoted
+    braces don't confuse it; Markdown fences, prose and anything after the
+    object are ignored. `feed` returns the object text as soon as its closing
+    brace arrives, so a caller can stop reading the stream there.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._comment = False
+        self._pending_slash = False
+        self.result: Optional[str] = None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.result is not None:
+            return self.result
+        for char in chunk:
+            if self._consume(char):
+                self.result = "".join(self._buffer)
+                return self.result
+        return None
+
+    def _consume(self, char: str) -> bool:
+        if self._depth == 0:
+            # Outside the object: wait for the opening brace
+            if char == "{":
+                self._depth = 1
+                self._buffer.append(char)
+            return False
+
+        if self._comment:
+            # JS-style comments models sometimes add; dropped up to the end of the line
+            if char == "\n":
+                self._comment = False
+            return False
+
+        if self._in_string:
+            self._buffer.append(char)
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+            return False
+
+        if self._pending_slash:
+            self._pending_slash = False
+            if char == "/":
+                self._comment = True
+                return False
+            self._buffer.append("/")
+
+        if char == "/":
+            self._pending_slash = True
+            return False
+
+        self._buffer.append(char)
+        if char == '"':
+            self._in_string = True
+        elif char == "{":
+            self._depth += 1
+        elif char == "}":
+            self._depth -= 1
+            return self._depth == 0
+        return False
+
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """First JSON object in a complete response, or None."""
+    parser = JSONStreamParser()
+    candidate = parser.feed(text)
+    if candidate is None:
+        return None
+    try:
+        value = json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def parse_model(text: str, schema: Type[T]) -> Optional[T]:
+    """Extracts and validates a schema instance from model output; None if it doesn't fit."""
+    value = extract_json(text)
+    if value is None:
+        return None
+    try:
+        return schema.model_validate(value)
+    except ValidationError as e:
+        print(f"[Structured] {schema.__name__} validation failed: {e}")
+        return None
+
+
+# --- per-agent output schemas ---
+
+class OnboardingUpdates(BaseModel):
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+    suggest_completion: Optional[bool] = None
+    onboarding_completed: Optional[bool] = None
+    check_family_code: Optional[str] = None
+    profile_data: Optional[Dict[str, Any]] = None
+
+
+class OnboardingOutput(BaseModel):
+    response: str = "I'm having trouble understanding. Could you repeat that?"
+    updates: OnboardingUpdates = OnboardingUpdates()
+
+
+class ScheduleDetails(BaseModel):
+    # Optional so a half-filled "clarify" answer still parses; the agent checks what it needs
+    title: Optional[str] = None
+    time: Optional[str] = None
+    type: str = "routine"
+    date: Optional[str] = None
+    assigned_to_name: Optional[str] = None
+
+
+class StrategistOutput(BaseModel):
+    action: Optional[str] = None
+    data: Optional[ScheduleDetails] = None
+    response: Optional[str] = None
+
+
+class VitalPoint(BaseModel):
+    type: str
+    value: float
+    unit: str
+
+
+class SimulationOutput(BaseModel):
+    action: Optional[str] = None
+    data: List[VitalPoint] = []
+    response: Optional[str] = None
@@ -0,0 +1,122 @@
+import os
+import json
+import textwrap
+import threading
+from typing import Any, Dict, List, Optional
+
+# Rough size of a token in characters for English text and JSON; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Output limits per agent. The intent classifier answers with a single word. Structured
+# agents keep the old 5000-token ceiling: a cut-off JSON object fails to parse, and
+# reading already stops at the end of the object, so a high cap costs nothing.
+AGENT_MAX_TOKENS = {
+    "intent": 10,
+    "onboarding": 5000,
+    "strategist": 5000,
+    "simulator": 5000,
+    "guardian": 512,
+    "concierge": 1024,
+    "auditor": 1536,
+    "companion": 1024,
+}
+DEFAULT_MAX_TOKENS = int(os.getenv("LLM_DEFAULT_MAX_TOKENS", "1024"))
+
+# Cap for strings in context serialized into prompts
+CONTEXT_MAX_STRING_CHARS = int(os.getenv("CONTEXT_MAX_STRING_CHARS", "500"))
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def max_tokens_for(agent: Optional[str]) -> int:
+    """Output limit for an agent; LLM_MAX_TOKENS_<AGENT> overrides the default table."""
+    if not agent:
+        return DEFAULT_MAX_TOKENS
+    override = os.getenv(f"LLM_MAX_TOKENS_{agent.upper()}")
+    if override:
+        return int(override)
+    return AGENT_MAX_TOKENS.get(agent, DEFAULT_MAX_TOKENS)
+
+
+def truncate_text(text: str, max_chars: int = CONTEXT_MAX_STRING_CHARS) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…"
+
+
+def compact_prompt(text: str) -> str:
+    """Removes the common indentation, trailing spaces and repeated blank lines triple-quoted prompts carry."""
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted)
+
+
+def prune(value: Any, max_chars: int = CONTEXT_MAX_STRING_CHARS) -> Any:
+    """Drops null/empty fields and shortens long strings.
+
+    Lists are kept whole: profile lists such as conditions or medications must never
+    lose entries. Conversation history is bounded where it is kept (SessionState.add_turn).
+    """
+    if isinstance(value, dict):
+        pruned = {k: prune(v, max_chars) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [prune(v, max_chars) for v in value]
+    if isinstance(value, str):
+        return truncate_text(value, max_chars)
+    return value
+
+
+def compact_json(value: Any) -> str:
+    """Smallest readable JSON for a prompt: pruned, no indentation or spaces after separators."""
+    return json.dumps(prune(value), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def fit_lines(lines: List[str], max_tokens: int) -> List[str]:
+    """Keeps lines in order until the budget is spent."""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+class TokenMeter:
+    """Per-agent prompt/completion size counters (estimated tokens) for /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Dict[str, int]] = {}
+
+    def record(self, agent: Optional[str], prompt_tokens: int, completion_tokens: int):
+        agent = agent or "default"
+        with self._lock:
+            stats = self._agents.setdefault(agent, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "max_prompt_tokens": 0})
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                agent: {
+                    **stats,
+                    "avg_prompt_tokens": round(stats["prompt_tokens"] / stats["calls"], 1),
+                    "max_tokens": max_tokens_for(agent if agent != "default" else None),
+                }
+                for agent, stats in self._agents.items()
+            }
+
+
+token_meter = TokenMeter()
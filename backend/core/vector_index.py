@@ -0,0 +1,47 @@
+import threading
+import numpy as np
+from typing import List, Dict, Any, Tuple
+
+from backend.core.embeddings import EMBEDDING_DIM
+
+
+class LocalVectorIndex:
+    """Brute-force cosine index kept in process memory, one matrix per user.
+
+    Stands in for the pgvector index when Supabase is unavailable (tests,
+    local runs) and keeps only the `max_per_user` newest entries per user.
+    """
+
+    def __init__(self, max_per_user: int = 5000):
+        self.max_per_user = max_per_user
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: str, vectors: np.ndarray, rows: List[Dict[str, Any]]):
+        with self._lock:
+            current = self._vectors.get(user_id, np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+            merged = np.vstack([current, vectors.astype(np.float32)])
+            merged_rows = self._rows.get(user_id, []) + list(rows)
+            if len(merged_rows) > self.max_per_user:
+                merged = merged[-self.max_per_user:]
+                merged_rows = merged_rows[-self.max_per_user:]
+            self._vectors[user_id] = merged
+            self._rows[user_id] = merged_rows
+
+    def search(self, user_id: str, query: np.ndarray, k: int = 5, threshold: float = 0.0) -> List[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            matrix = self._vectors.get(user_id)
+            rows = self._rows.get(user_id, [])
+        if matrix is None or not len(rows):
+            return []
+
+        # Vectors are unit length, so the dot product is the cosine similarity
+        scores = matrix @ query.astype(np.float32)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), rows[i]) for i in top if scores[i] >= threshold]
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._rows.values())
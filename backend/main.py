@@ -1,7 +1,11 @@
-from fastapi import FastAPI, HTTPException, Request, Header
+from backend.core.lazy import components
+from fastapi import FastAPI, HTTPException, Request, Header, Form, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
+import sys
+import json
 from dotenv import load_dotenv
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,6 +25,10 @@ app.include_router(family.router)
 app.include_router(schedule.router)
 from backend.routers import kitchen
 app.include_router(kitchen.router)
+from backend.routers import attachments
+app.include_router(attachments.router)
+from backend.routers import vitals
+app.include_router(vitals.router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 class ChatRequest(BaseModel):
@@ -35,17 +44,108 @@ class ChatRequest(BaseModel):
     user_id: str
     context: Optional[Dict[str, Any]] = {}
     attachments: Optional[List[Dict[str, str]]] = None # [{"type": "image/png", "data": "base64..."}]
+    attachment_ids: Optional[List[str]] = None # ids returned by POST /api/attachments
+    session_id: Optional[str] = None # server-side conversation state; context only needs to carry what's new
 
 class ChatResponse(BaseModel):
     response: str
     metadata: Optional[Dict[str, Any]] = {}
 
+@app.on_event("startup")
+async def startup():
+    from backend.core.memory_writer import memory_writer
+    memory_writer.start()
+    # LLM SDKs, Supabase and the agents load on first use; this is the cost of everything else
+    components.mark_ready()
+    print(f"Startup took {components.ready_seconds}s")
+
+@app.on_event("shutdown")
+async def shutdown():
+    from backend.core.memory_writer import memory_writer
+    from backend.core.attachments import shutdown_pool
+    await memory_writer.stop()
+    if components.loaded("llm_client"):
+        await components.get("llm_client").aclose()
+    shutdown_pool()
+    if "backend.core.database" in sys.modules:
+        sys.modules["backend.core.database"].registry.close()
+
 @app.get("/")
 async def root():
     return {"message": "Liora AI Backend is running"}
 
+@app.get("/metrics")
+async def metrics():
+    from backend.core.llm_cache import llm_cache
+    from backend.core.tokens import token_meter
+    stats = {"llm_cache": llm_cache.stats(), "tokens": token_meter.stats(), "startup": components.stats()}
+    if components.loaded("llm_client"):
+        stats["llm_providers"] = components.get("llm_client").router.stats()
+    return stats
+
+def remember_turn(user_id: str, message: str, response_text: str):
+    from backend.core.memory_writer import memory_writer
+    memory_writer.enqueue(user_id, message, {"role": "user"})
+    memory_writer.enqueue(user_id, response_text, {"role": "assistant"})
+
+# Keys a client may set on an inline attachment; ref/sha256/bytes are only ever set server-side
+INLINE_ATTACHMENT_KEYS = {"type", "name", "data"}
+
+def resolve_attachments(request: ChatRequest) -> Optional[List[Dict[str, Any]]]:
+    """Inline attachments plus references to uploaded files; the bytes stay on disk until a provider needs them."""
+    for att in request.attachments or []:
+        unexpected = set(att) - INLINE_ATTACHMENT_KEYS
+        if unexpected:
+            raise HTTPException(status_code=400, detail=f"Unsupported attachment fields: {', '.join(sorted(unexpected))}")
+    if not request.attachment_ids:
+        return request.attachments
+    from backend.core.attachment_store import attachment_store
+    resolved = list(request.attachments or [])
+    for attachment_id in request.attachment_ids:
+        try:
+            ref = attachment_store.reference(attachment_id, request.user_id)
+        except ValueError:
+            ref = None
+        if not ref:
+            raise HTTPException(status_code=400, detail=f"Unknown or expired attachment: {attachment_id}")
+        resolved.append(ref)
+    return resolved
+
+async def persist_updates(user_id: str, updates: Dict[str, Any]):
+    if not updates:
+        return
+    try:
+        from backend.core.repository import repository
+        update_payload = {}
+        
+        # Handle Family Join
+        if "join_family_id" in updates:
+            update_payload["family_id"] = updates["join_family_id"]
+
+        # Handle Onboarding Completion
+        if "onboarding_completed" in updates:
+            update_payload["onboarding_completed"] = updates["onboarding_completed"]
+
+        # Profile data is a partial patch, merged into the stored JSON by the database
+        patch = updates.get("profile_data")
+
+        if update_payload or patch:
+            print(f"Persisting updates for user {user_id}: {list(update_payload) + (['profile_data'] if patch else [])}")
+            await repository.merge_profile(user_id, patch, update_payload)
+
+            from backend.core.member_cache import member_cache
+            from backend.services.dashboard_service import dashboard_service
+            member_cache.invalidate(user_id, update_payload.get("family_id"))
+            dashboard_service.invalidate_member(user_id)
+            dashboard_service.invalidate_family(update_payload.get("family_id"))
+
+    except Exception as e:
+        print(f"Error persisting updates: {e}")
+        # Don't fail the request, just log it
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Header(None)):
+    attachments = resolve_attachments(request)
     try:
         token = None
         if authorization and authorization.startswith("Bearer "):
@@ -53,65 +153,22 @@ async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Hea
 
         from backend.agents.orchestrator import orchestrator
         
-        # 1. Retrieve context/memory (Placeholder)
-        # memories = await memory_manager.query_memory(request.user_id, request.message)
-        
-        # 2. Process message via Orchestrator
+        # 1. Process message via Orchestrator (which assembles profile, family, vitals,
+        #    schedule and memories for the request in one parallel wave)
         response_text, updates = await orchestrator.process_message(
             message=request.message,
             user_id=request.user_id,
             context=request.context,
-            message=request.message,
-            user_id=request.user_id,
-            context=request.context,
-            attachments=request.attachments,
-            token=token
+            attachments=attachments,
+            token=token,
+            session_id=request.session_id
         )
         
-        # 3. Save to memory (Placeholder)
-        # await memory_manager.add_memory(request.user_id, request.message, {"role": "user"})
-        # await memory_manager.add_memory(request.user_id, response_text, {"role": "assistant"})
+        # 2. Save to memory (write-behind, persisted in the background)
+        remember_turn(request.user_id, request.message, response_text)
 
         # --- PERSIST UPDATES TO SUPABASE ---
-        if updates:
-            try:
-                from backend.core.database import supabase
-                update_payload = {}
-                
-                # Handle Family Join
-                if "join_family_id" in updates:
-                    update_payload["family_id"] = updates["join_family_id"]
-                
-                # Handle Profile Data Updates
-                if "profile_data" in updates:
-                    # We need to merge, but for now let's just update the JSON column
-                    # Ideally we should fetch existing, merge, and save.
-                    # But Supabase JSONB updates can be tricky.
-                    # Let's assume the agent returns the full profile_data or we just patch it.
-                    # For safety, let's just save what we got.
-                    # Actually, we should probably fetch the current profile first to be safe, 
-                    # but for speed let's trust the agent's output or just update the specific fields if possible.
-                    # The agent returns "updates" -> "profile_data".
-                    # Let's just update the profile_data column.
-                    # Wait, if we overwrite, we might lose data not in the update.
-                    # The agent usually returns the *new* fields.
-                    # Let's fetch current first.
-                    current_profile = supabase.table("profiles").select("profile_data").eq("id", request.user_id).single().execute()
-                    current_data = current_profile.data.get("profile_data") or {}
-                    current_data.update(updates["profile_data"])
-                    update_payload["profile_data"] = current_data
-
-                # Handle Onboarding Completion
-                if "onboarding_completed" in updates:
-                    update_payload["onboarding_completed"] = updates["onboarding_completed"]
-
-                if update_payload:
-                    print(f"Persisting updates for user {request.user_id}: {update_payload.keys()}")
-                    supabase.table("profiles").update(update_payload).eq("id", request.user_id).execute()
-
-            except Exception as e:
-                print(f"Error persisting updates: {e}")
-                # Don't fail the request, just log it
+        await persist_updates(request.user_id, updates)
         
         return ChatResponse(
             response=response_text,
@@ -125,5 +182,83 @@ async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Hea
             f.write(f"Error processing request: {str(e)}\n{error_msg}\n")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/multipart", response_model=ChatResponse)
+async def chat_multipart_endpoint(
+    message: str = Form(...),
+    user_id: str = Form(...),
+    context: str = Form("{}"),
+    session_id: Optional[str] = Form(None),
+    files: List[UploadFile] = File([]),
+    authorization: Optional[str] = Header(None)
+):
+    """Same as /chat, but files arrive as multipart parts and are spooled to disk instead of base64 JSON."""
+    from backend.core.attachment_store import attachment_store, AttachmentTooLarge
+    try:
+        client_context = json.loads(context or "{}")
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="context must be a JSON object")
+    if not isinstance(client_context, dict):
+        raise HTTPException(status_code=400, detail="context must be a JSON object")
+    try:
+        stored = [await attachment_store.save(upload, user_id) for upload in files]
+    except AttachmentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    request = ChatRequest(
+        message=message,
+        user_id=user_id,
+        context=client_context,
+        session_id=session_id,
+        attachment_ids=[meta["id"] for meta in stored]
+    )
+    return await chat_endpoint(request, authorization)
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, authorization: Optional[str] = Header(None)):
+    """Server-Sent Events variant of /chat.
+
+    Emits `token` events as text arrives and a final `done` event with the
+    same metadata /chat returns, once updates have been persisted.
+    """
+    token = None
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization.split(" ")[1]
+
+    from backend.agents.orchestrator import orchestrator
+    attachments = resolve_attachments(request)
+
+    async def event_stream():
+        chunks = []
+        try:
+            async for event in orchestrator.stream_message(
+                message=request.message,
+                user_id=request.user_id,
+                context=request.context,
+                attachments=attachments,
+                token=token,
+                session_id=request.session_id
+            ):
+                if event["type"] == "token":
+                    chunks.append(event["content"])
+                    yield _sse("token", {"content": event["content"]})
+                else:
+                    updates = event.get("updates", {})
+                    await persist_updates(request.user_id, updates)
+                    remember_turn(request.user_id, request.message, "".join(chunks))
+                    yield _sse("done", {"agent": event.get("agent") or "Dynamic", "updates": updates})
+        except Exception as e:
+            import traceback
+            print(traceback.format_exc())
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
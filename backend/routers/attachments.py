@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from typing import List
+from backend.core.attachment_store import attachment_store, AttachmentTooLarge
+
+router = APIRouter(
+    prefix="/api/attachments",
+    tags=["attachments"]
+)
+
+@router.post("/")
+async def upload_attachments(user_id: str = Form(...), files: List[UploadFile] = File(...)):
+    """Stores raw uploads for `user_id` and returns ids to pass as `attachment_ids` to that user's /chat."""
+    try:
+        stored = [await attachment_store.save(upload, user_id) for upload in files]
+    except AttachmentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return [{k: meta[k] for k in ("id", "name", "type", "size")} for meta in stored]
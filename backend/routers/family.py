@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from backend.core.database import supabase
+from backend.core.repository import repository
 from pydantic import BaseModel
 from typing import Optional, List
 
@@ -18,25 +18,23 @@ async def get_family_members(family_id: str):
             return [] # Return empty list for invalid/placeholder IDs
 
         # Get all profiles associated with this family_id
-        response = supabase.table("profiles").select("*").eq("family_id", family_id).execute()
-        return response.data
+        return await repository.list_family_members(family_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/code/{invite_code}")
 async def get_family_by_code(invite_code: str):
     try:
-        response = supabase.table("families").select("*").eq("invite_code", invite_code).execute()
-        if not response.data:
+        family = await repository.get_family_by_code(invite_code)
+        if not family:
             raise HTTPException(status_code=404, detail="Family not found")
-        return response.data[0]
+        return family
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{family_id}")
 async def get_family_details(family_id: str):
     try:
-        response = supabase.table("families").select("*").eq("id", family_id).single().execute()
-        return response.data
+        return await repository.get_family(family_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
-from backend.core.database import supabase
+from backend.core.repository import repository
+from backend.services.dashboard_service import dashboard_service
 
 router = APIRouter(
     prefix="/kitchen",
@@ -30,15 +31,10 @@ class InventoryItem(InventoryItemBase):
 async def get_inventory(user_id: str):
     try:
         # First get the user's family_id
-        user_response = supabase.table("profiles").select("family_id").eq("id", user_id).single().execute()
-        family_id = user_response.data.get("family_id")
+        profile = await repository.get_profile(user_id, "family_id")
+        family_id = profile.get("family_id") if profile else None
 
-        if family_id:
-            response = supabase.table("inventory_items").select("*").eq("family_id", family_id).execute()
-        else:
-            response = supabase.table("inventory_items").select("*").eq("user_id", user_id).execute()
-            
-        return response.data
+        return await repository.list_inventory(family_id=family_id, user_id=user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -47,21 +43,24 @@ async def add_item(item: InventoryItemCreate):
     try:
         # If family_id is not provided, try to fetch it
         if not item.family_id:
-             user_response = supabase.table("profiles").select("family_id").eq("id", item.user_id).single().execute()
-             item.family_id = user_response.data.get("family_id")
+             profile = await repository.get_profile(item.user_id, "family_id")
+             item.family_id = profile.get("family_id") if profile else None
 
         data = item.dict()
-        response = supabase.table("inventory_items").insert(data).execute()
-        if not response.data:
+        created = await repository.insert_inventory_item(data)
+        if not created:
              raise HTTPException(status_code=400, detail="Failed to create item")
-        return response.data[0]
+        dashboard_service.invalidate_family(item.family_id)
+        return created
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/inventory/{item_id}")
 async def delete_item(item_id: str):
     try:
-        response = supabase.table("inventory_items").delete().eq("id", item_id).execute()
+        deleted = await repository.delete_inventory_item(item_id)
+        if deleted:
+            dashboard_service.invalidate_family(deleted.get("family_id"))
         return {"message": "Item deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -69,9 +68,10 @@ async def delete_item(item_id: str):
 @router.put("/inventory/{item_id}", response_model=InventoryItem)
 async def update_item(item_id: str, item: InventoryItemBase):
     try:
-        response = supabase.table("inventory_items").update(item.dict()).eq("id", item_id).execute()
-        if not response.data:
+        updated = await repository.update_inventory_item(item_id, item.dict())
+        if not updated:
              raise HTTPException(status_code=404, detail="Item not found")
-        return response.data[0]
+        dashboard_service.invalidate_family(updated.get("family_id"))
+        return updated
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
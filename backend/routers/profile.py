@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
-from backend.core.database import supabase
+from backend.core.repository import repository
+from backend.services.dashboard_service import dashboard_service
+from backend.core.member_cache import member_cache
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
@@ -22,10 +24,10 @@ async def get_profile(user_id: str):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-        response = supabase.table("profiles").select("*").eq("id", user_id).execute()
-        if not response.data:
+        profile = await repository.get_profile(user_id)
+        if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
-        return response.data[0]
+        return profile
     except HTTPException:
         raise
     except Exception as e:
@@ -34,13 +36,20 @@ async def get_profile(user_id: str):
 @router.put("/{user_id}")
 async def update_profile(user_id: str, profile: ProfileUpdate):
     try:
-        data = {}
-        if profile.full_name:
-            data["full_name"] = profile.full_name
-        if profile.profile_data:
-            data["profile_data"] = profile.profile_data
-            
-        response = supabase.table("profiles").update(data).eq("id", user_id).execute()
-        return response.data
+        # profile_data is merged into the stored JSON in one statement, like the chat path's
+        # updates, so neither write can drop keys the other just added; nulls are ignored
+        columns = profile.model_dump(exclude_unset=True, exclude_none=True)
+        patch = columns.pop("profile_data", None)
+        if not columns and not patch:
+            raise HTTPException(status_code=400, detail="Nothing to update")
+
+        updated = await repository.merge_profile(user_id, patch, columns)
+        member_cache.invalidate(user_id)
+        dashboard_service.invalidate_member(user_id)
+        for row in updated or []:
+            dashboard_service.invalidate_family(row.get("family_id"))
+        return updated
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
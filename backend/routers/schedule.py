@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from backend.core.database import supabase
-from datetime import date
+from typing import List, Optional, Dict, Any, Tuple
+import base64
+import json
+import re
+import uuid
+from backend.core.repository import repository
+from backend.core.member_cache import member_cache, member_info
+from backend.services.dashboard_service import dashboard_service
+from datetime import date, datetime
 
 router = APIRouter(
     prefix="/schedules",
@@ -41,107 +47,91 @@ class ScheduleUpdate(BaseModel):
     description: Optional[str] = None
     assigned_to: Optional[str] = None
 
+def _encode_cursor(item: Dict[str, Any]) -> str:
+    raw = json.dumps([item["date"], item["time"], item["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[str, str, str]:
+    try:
+        c_date, c_time, c_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date.fromisoformat(c_date)
+        uuid.UUID(c_id)
+        if not re.fullmatch(r"\d{1,2}:\d{2}(:\d{2})?", c_time):
+            raise ValueError(c_time)
+        return c_date, c_time, c_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _parse_date(value: Optional[str], name: str) -> Optional[str]:
+    # Accepts an ISO date or datetime; schedules are filtered on their date column
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid '{name}' date: {value}")
+
 @router.get("/{family_id}", response_model=List[ScheduleItem])
 async def get_schedules(
+    response: Response,
     family_id: str, 
     date_str: Optional[str] = Query(None, alias="date"),
     status: Optional[str] = Query(None),
-    limit: Optional[int] = Query(None)
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None)
 ):
-    # Select schedules and join with profiles to get assignee name
-    query = supabase.table("schedules").select("*, profiles:assigned_to(full_name, profile_data)").eq("family_id", family_id)
-    
-    if date_str:
-        query = query.eq("date", date_str)
-    
-    if status:
-        query = query.eq("status", status)
-        
-    # Sort by date and time descending for history (most recent first)
-    # For daily view, we might want ascending, but let's handle that in frontend or add a sort param.
-    # Defaulting to descending for now as it fits history better, and daily view sorts in frontend.
-    query = query.order("date", desc=True).order("time", desc=True)
+    # Sorted by (date, time, id); descending by default since it fits history best.
+    # When `limit` is set and more rows exist, the X-Next-Cursor header holds the
+    # cursor for the following page.
+    after = _decode_cursor(cursor) if cursor else None
+    date_str = _parse_date(date_str, "date")
+    date_from = _parse_date(date_from, "from")
+    date_to = _parse_date(date_to, "to")
+    rows = await repository.list_schedules(
+        family_id,
+        date=date_str,
+        status=status,
+        limit=limit + 1 if limit else None,
+        date_from=date_from,
+        date_to=date_to,
+        after=after,
+        descending=order == "desc"
+    )
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
     
-    if limit:
-        query = query.limit(limit)
-        
-    response = query.execute()
+    # Assignees come from the member cache; a cold cache costs one bulk lookup
+    members = await member_cache.get_many(item.get("assigned_to") for item in rows)
     
     schedules = []
-    for item in response.data:
-        member_info = None
-        profile = item.get("profiles")
-        
-        if profile:
-            color = "bg-blue-500"
-            if profile.get("profile_data") and isinstance(profile["profile_data"], dict):
-                color = profile["profile_data"].get("color", "bg-blue-500")
-                
-            member_info = {
-                "name": profile.get("full_name") or "Unknown",
-                "color": color
-            }
-        else:
-            member_info = {
-                "name": "Family",
-                "color": "bg-purple-500"
-            }
-            
-        item["member"] = member_info
+    for item in rows:
+        item["member"] = member_info(members.get(item.get("assigned_to")))
         schedules.append(item)
         
     return schedules
 
 @router.post("/", response_model=ScheduleItem)
 async def create_schedule(schedule: ScheduleCreate):
-    response = supabase.table("schedules").insert(schedule.dict()).execute()
-    if not response.data:
+    created_item = await repository.insert_schedule(schedule.dict())
+    if not created_item:
         raise HTTPException(status_code=400, detail="Failed to create schedule")
+    dashboard_service.invalidate_family(schedule.family_id)
     
-    # We need to return the item with member info. 
-    # For a newly created item, we can just fetch it again or construct the response.
-    # Let's construct it to save a round trip if possible, but we need the profile name.
-    created_item = response.data[0]
-    
-    member_info = {"name": "Family", "color": "bg-purple-500"}
-    if schedule.assigned_to:
-        # Fetch profile name
-        prof_res = supabase.table("profiles").select("full_name, profile_data").eq("id", schedule.assigned_to).single().execute()
-        if prof_res.data:
-            color = "bg-blue-500"
-            if prof_res.data.get("profile_data") and isinstance(prof_res.data["profile_data"], dict):
-                color = prof_res.data["profile_data"].get("color", "bg-blue-500")
-            member_info = {
-                "name": prof_res.data.get("full_name"),
-                "color": color
-            }
-            
-    created_item["member"] = member_info
+    created_item["member"] = member_info(await member_cache.get(schedule.assigned_to))
     return created_item
 
 @router.patch("/{schedule_id}", response_model=ScheduleItem)
 async def update_schedule(schedule_id: str, update: ScheduleUpdate):
     update_data = {k: v for k, v in update.dict().items() if v is not None}
     
-    response = supabase.table("schedules").update(update_data).eq("id", schedule_id).execute()
-    if not response.data:
+    updated_item = await repository.update_schedule(schedule_id, update_data)
+    if not updated_item:
         raise HTTPException(status_code=404, detail="Schedule not found")
-        
-    updated_item = response.data[0]
+    dashboard_service.invalidate_family(updated_item.get("family_id"))
     
-    # Re-fetch or reconstruct member info
-    member_info = {"name": "Family", "color": "bg-purple-500"}
-    assigned_to = updated_item.get("assigned_to")
-    if assigned_to:
-         prof_res = supabase.table("profiles").select("full_name, profile_data").eq("id", assigned_to).single().execute()
-         if prof_res.data:
-            color = "bg-blue-500"
-            if prof_res.data.get("profile_data") and isinstance(prof_res.data["profile_data"], dict):
-                color = prof_res.data["profile_data"].get("color", "bg-blue-500")
-            member_info = {
-                "name": prof_res.data.get("full_name"),
-                "color": color
-            }
-            
-    updated_item["member"] = member_info
+    updated_item["member"] = member_info(await member_cache.get(updated_item.get("assigned_to")))
     return updated_item
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+import uuid
+from backend.core.repository import repository
+from backend.services.vitals_service import VitalsIngestor, TooManyRows, LineTooLong, iter_lines, iter_rows, get_series
+from backend.services.dashboard_service import dashboard_service
+
+router = APIRouter(
+    prefix="/api/vitals",
+    tags=["vitals"]
+)
+
+@router.post("/bulk")
+async def bulk_ingest(
+    request: Request,
+    user_id: str = Query(...),
+    source: str = Query("device", max_length=40),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$")
+):
+    """Streams an NDJSON or CSV export (type, value, unit, recorded_at per row) into vitals.
+
+    The body is read incrementally, validated in batches and upserted in chunks;
+    readings already stored for the same type and time are skipped.
+    """
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user ID format")
+
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    ingestor = VitalsIngestor(user_id, source)
+    try:
+        summary = await ingestor.ingest(iter_rows(iter_lines(request.stream()), fmt))
+    except (TooManyRows, LineTooLong) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 text")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if ingestor.inserted:
+            dashboard_service.invalidate_member(user_id)
+
+    if summary["inserted"]:
+        try:
+            profile = await repository.get_profile(user_id, "family_id")
+            dashboard_service.invalidate_family(profile.get("family_id") if profile else None)
+        except Exception as e:
+            print(f"Failed to invalidate family dashboard for {user_id}: {e}")
+    return summary
+
+def _parse_time(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+@router.get("/{user_id}/series")
+async def get_vitals_series(
+    user_id: str,
+    type: str = Query(...),
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = Query(None),
+    resolution: str = Query("auto", pattern="^(auto|raw|hour|day)$")
+):
+    """Bounded-size series for charts; `resolution=auto` picks raw, hourly or daily points from the window."""
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user ID format")
+
+    end = _parse_time(to, datetime.now(timezone.utc))
+    start = _parse_time(from_, end - timedelta(days=7))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    try:
+        return await get_series(user_id, type, start, end, resolution)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,233 @@
+import os
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from backend.core.cache import TTLCache
+from backend.services.dashboard_service import VITAL_THRESHOLDS
+from backend.services.vitals_service import _to_epoch
+
+# Each reading is compared with the mean/std of the previous ANOMALY_BASELINE_POINTS
+# readings of the same member and type
+ANOMALY_BASELINE_POINTS = int(os.getenv("ANOMALY_BASELINE_POINTS", "30"))
+ANOMALY_MIN_BASELINE = int(os.getenv("ANOMALY_MIN_BASELINE", "10"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3"))
+ANOMALY_LOOKBACK_DAYS = float(os.getenv("ANOMALY_LOOKBACK_DAYS", "14"))
+# Baselines are reloaded from the database after this long, which also picks up edits and deletes
+ANOMALY_STATE_TTL = float(os.getenv("ANOMALY_STATE_TTL", "3600"))
+ANOMALY_MAX_FINDINGS = 20
+ANOMALY_LOAD_LIMIT = 20000
+
+# Smallest std a baseline is given per type (stored units), so near-flat series such as
+# a resting heart rate alternating 70/71 don't turn a 72 into a 3-sigma outlier.
+# Other types get ANOMALY_MIN_RELATIVE_STD of their baseline mean.
+ANOMALY_MIN_STD = {
+    "heart_rate": 2.0,
+    "resting_heart_rate": 2.0,
+    "hrv": 5.0,
+    "spo2": 1.0,
+    "respiratory_rate": 1.0,
+    "glucose": 5.0,
+    "temperature": 0.2,
+    "steps": 500.0,
+    "sleep": 0.5,
+    "calories": 100.0,
+    "weight": 0.5,
+}
+ANOMALY_MIN_RELATIVE_STD = 0.01
+
+LEVELS = ("normal", "unusual", "warning", "danger")
+
+
+def score(groups: np.ndarray, stamps: np.ndarray, values: np.ndarray, min_std: Optional[np.ndarray] = None, window: int = ANOMALY_BASELINE_POINTS, min_baseline: int = ANOMALY_MIN_BASELINE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rolling baseline and z-score of every reading against the readings before it in its group.
+
+    All groups are handled in one pass: readings are sorted by (group, time) and the
+    window sums come from cumulative sums, so the cost is O(n log n) whatever the
+    number of members and types. `min_std` is a per-reading floor on the baseline std
+    (NaN = ANOMALY_MIN_RELATIVE_STD of the baseline mean). Returns (sort order, baseline
+    mean, z) in sorted order; z is NaN where the baseline is too short or flat to judge.
+    """
+    order = np.lexsort((stamps, groups))
+    g, v = groups[order], values[order]
+    floor = np.full(len(v), np.nan) if min_std is None else min_std[order]
+    idx = np.arange(len(v))
+
+    first = np.r_[True, g[1:] != g[:-1]] if len(g) else np.zeros(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(first, idx, 0)) if len(g) else idx
+    lo = np.maximum(group_start, idx - window)
+    count = idx - lo
+
+    # Shifting by each group's first value keeps the running sums small (steps vs spo2)
+    shifted = v - v[group_start]
+    c1 = np.r_[0.0, np.cumsum(shifted)]
+    c2 = np.r_[0.0, np.cumsum(shifted * shifted)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (c1[idx] - c1[lo]) / count
+        std = np.sqrt(np.maximum((c2[idx] - c2[lo]) / count - mean * mean, 0))
+        floor = np.where(np.isnan(floor), ANOMALY_MIN_RELATIVE_STD * np.abs(mean + v[group_start]), floor)
+        std = np.fmax(std, floor)
+        z = (shifted - mean) / std
+    z[(count < min_baseline) | ~(std > 1e-9)] = np.nan
+    return order, mean + v[group_start], z
+
+
+def threshold_levels(types: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Index into LEVELS of each reading against VITAL_THRESHOLDS (0 when in range)."""
+    levels = np.zeros(len(values), dtype=np.int8)
+    for vital_type, bounds in VITAL_THRESHOLDS.items():
+        of_type = types == vital_type
+        if not of_type.any():
+            continue
+        for level in ("warning", "danger"):
+            low, high = bounds[level]
+            outside = np.zeros(len(values), dtype=bool)
+            if low is not None:
+                outside |= values < low
+            if high is not None:
+                outside |= values > high
+            levels[of_type & outside] = LEVELS.index(level)
+    return levels
+
+
+def _top(findings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Most severe, then most recent findings first, capped at ANOMALY_MAX_FINDINGS."""
+    return sorted(findings, key=lambda f: (LEVELS.index(f["level"]), f["recorded_at"]), reverse=True)[:ANOMALY_MAX_FINDINGS]
+
+
+class _Baseline:
+    """Per-member state: the last readings of each type and the findings so far."""
+
+    def __init__(self):
+        self.tails: Dict[str, Tuple[np.ndarray, np.ndarray, str]] = {}
+        self.findings: List[Dict[str, Any]] = []
+
+
+class AnomalyEngine:
+    """Deterministic anomaly findings over a family's vitals.
+
+    A member's recent history is loaded and scored once; after that, readings
+    written through the app are scored incrementally against the kept tail of
+    each series. The Auditor gets the findings as text instead of raw series.
+    """
+
+    def __init__(self):
+        self._states = TTLCache(ttl=ANOMALY_STATE_TTL, maxsize=2048)
+
+    def _evaluate(self, rows: List[Dict[str, Any]], fresh: np.ndarray) -> Dict[str, _Baseline]:
+        """Scores `rows` (dicts with user_id/type/value/unit/recorded_at) and returns per-member
+        tails plus findings for the rows flagged in `fresh`."""
+        users = np.array([r["user_id"] for r in rows], dtype=object)
+        types = np.array([r["type"] for r in rows], dtype=object)
+        units = np.array([r.get("unit") or "" for r in rows], dtype=object)
+        values = np.array([float(r["value"]) for r in rows], dtype=np.float64)
+        stamps = np.array([_to_epoch(r["recorded_at"]) for r in rows], dtype=np.float64)
+        _, groups = np.unique(np.array([f"{u}:{t}" for u, t in zip(users, types)], dtype=object), return_inverse=True)
+
+        min_std = np.array([ANOMALY_MIN_STD.get(t, np.nan) for t in types], dtype=np.float64)
+        order, baseline, z = score(groups, stamps, values, min_std)
+        users, types, units, values, stamps, groups, fresh = (a[order] for a in (users, types, units, values, stamps, groups, fresh))
+        levels = threshold_levels(types, values)
+        levels[(levels == 0) & (np.abs(np.nan_to_num(z)) >= ANOMALY_Z_THRESHOLD)] = LEVELS.index("unusual")
+        flagged = fresh & (levels > 0)
+
+        states: Dict[str, _Baseline] = {}
+        last = np.r_[groups[1:] != groups[:-1], True] if len(groups) else np.zeros(0, dtype=bool)
+        for end in np.flatnonzero(last):
+            start = max(end + 1 - ANOMALY_BASELINE_POINTS, 0)
+            start += int(np.argmax(groups[start:end + 1] == groups[end]))
+            state = states.setdefault(users[end], _Baseline())
+            state.tails[types[end]] = (stamps[start:end + 1], values[start:end + 1], units[end])
+
+        for i in np.flatnonzero(flagged):
+            states.setdefault(users[i], _Baseline()).findings.append({
+                "user_id": users[i],
+                "type": types[i],
+                "value": round(float(values[i]), 2),
+                "unit": units[i],
+                "recorded_at": datetime.fromtimestamp(stamps[i], tz=timezone.utc).isoformat(timespec="minutes"),
+                "level": LEVELS[levels[i]],
+                "z": None if np.isnan(z[i]) else round(float(z[i]), 1),
+                "baseline": None if np.isnan(z[i]) else round(float(baseline[i]), 1),
+            })
+        return states
+
+    async def _load(self, user_ids: List[str]):
+        from backend.core.repository import repository
+        since = (datetime.now(timezone.utc) - timedelta(days=ANOMALY_LOOKBACK_DAYS)).isoformat()
+        rows = await repository.list_recent_vitals(user_ids, since, ANOMALY_LOAD_LIMIT)
+        rows = [r for r in rows if r.get("value") is not None]
+        states = self._evaluate(rows, np.ones(len(rows), dtype=bool)) if rows else {}
+        for user_id in user_ids:
+            state = states.get(user_id) or _Baseline()
+            state.findings = _top(state.findings)
+            self._states.set(user_id, state)
+
+    def observe(self, user_id: str, records: List[Dict[str, Any]]):
+        """Scores newly written readings against the member's kept baselines.
+
+        Members without loaded state are skipped; their readings are picked up on the
+        next load. Readings that don't extend a series (backfills, re-sent exports)
+        drop the state so it is reloaded in order.
+        """
+        state: Optional[_Baseline] = self._states.get(user_id)
+        if state is None or not records:
+            return
+        try:
+            for record in records:
+                tail = state.tails.get(record["type"])
+                if tail is not None and len(tail[0]) and _to_epoch(record["recorded_at"]) <= tail[0][-1]:
+                    self._states.invalidate(user_id)
+                    return
+
+            history = [
+                {"user_id": user_id, "type": vital_type, "value": value, "unit": unit, "recorded_at": stamp}
+                for vital_type, (stamps, values, unit) in state.tails.items()
+                for stamp, value in zip(stamps.tolist(), values.tolist())
+            ]
+            rows = history + [{**r, "user_id": user_id} for r in records]
+            fresh = np.r_[np.zeros(len(history), dtype=bool), np.ones(len(records), dtype=bool)]
+            update = self._evaluate(rows, fresh).get(user_id, _Baseline())
+            state.tails.update(update.tails)
+            state.findings = _top(state.findings + update.findings)
+        except Exception as e:
+            print(f"[Anomaly] Failed to score new vitals for {user_id}: {e}")
+            self._states.invalidate(user_id)
+
+    async def findings(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Findings for the given members, most severe and most recent first."""
+        cold = [user_id for user_id in user_ids if user_id not in self._states]
+        if cold:
+            await self._load(cold)
+        found = []
+        for user_id in user_ids:
+            state = self._states.get(user_id)
+            if state:
+                found.extend(state.findings)
+        return _top(found)
+
+    async def family_report(self, ctx) -> str:
+        """Plain-text findings for the user's family (or just the user) for the Auditor prompt."""
+        members = ctx.family_members or [{"id": ctx.user_id, "full_name": ctx.profile.get("full_name")}]
+        names = {m["id"]: m.get("full_name") or "Member" for m in members if m.get("id")}
+        try:
+            found = await self.findings(list(names))
+        except Exception as e:
+            print(f"[Anomaly] Failed to load findings: {e}")
+            return ""
+
+        header = (
+            f"Precomputed anomaly findings (last {ANOMALY_LOOKBACK_DAYS:g} days; z-scores against each member's "
+            f"previous {ANOMALY_BASELINE_POINTS} readings, levels from the dashboard thresholds):"
+        )
+        if not found:
+            return f"{header}\nNo anomalies found."
+        lines = [header]
+        for f in found:
+            line = f"- {names.get(f['user_id'], 'Member')}: {f['type']} {f['value']:g} {f['unit']} at {f['recorded_at']} [{f['level']}]"
+            if f["z"] is not None:
+                line += f" z={f['z']:+g} vs baseline {f['baseline']:g}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+anomaly_engine = AnomalyEngine()
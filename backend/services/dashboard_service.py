@@ -1,9 +1,44 @@
-from typing import Dict, Any, List
+import os
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from backend.core.cache import TTLCache
+
+VITAL_TYPES = ["heart_rate", "spo2", "steps", "sleep", "calories"]
+
+# (low, high) bounds outside of which a reading is flagged; None means unbounded
+VITAL_THRESHOLDS = {
+    "heart_rate": {"danger": (40, 130), "warning": (50, 100)},
+    "spo2": {"danger": (90, None), "warning": (95, None)},
+}
+
+STATUS_MOODS = {"good": "😊", "warning": "😐", "danger": "😓"}
+STATUS_COLORS = {"good": "border-green-500", "warning": "border-yellow-500", "danger": "border-red-500"}
+
+EXPIRY_WINDOW_DAYS = 3
+
+# Family dashboards are cached briefly and dropped whenever a member's data changes
+FAMILY_DASHBOARD_TTL = float(os.getenv("FAMILY_DASHBOARD_TTL", "60"))
 
 class DashboardService:
+    def __init__(self):
+        self._family_cache = TTLCache(ttl=FAMILY_DASHBOARD_TTL)
+        # member -> family, only needed while that family's dashboard is cached
+        self._member_family = TTLCache(ttl=FAMILY_DASHBOARD_TTL, maxsize=10000)
+
+    @staticmethod
+    def _trend(latest: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> str:
+        if not previous:
+            return "First reading"
+        delta = float(latest["value"]) - float(previous["value"])
+        if delta == 0:
+            return "No change"
+        direction = "Up" if delta > 0 else "Down"
+        return f"{direction} {abs(delta):g} {latest['unit']} since last reading"
+
     async def get_user_dashboard(self, user_id: str) -> Dict[str, Any]:
         # Fetch latest vitals from DB
-        from backend.core.database import supabase
+        from backend.core.repository import repository
         
         # Default values
         vitals = {
@@ -15,28 +50,19 @@ class DashboardService:
         }
         
         try:
-            # Get latest for each type
-            # Note: In a real app, we'd do a more complex query or aggregation. 
-            # Here we just get the absolute latest record for each type.
-            for v_type in ["heart_rate", "spo2", "steps", "sleep", "calories"]:
-                try:
-                    res = supabase.table("vitals") \
-                        .select("*") \
-                        .eq("user_id", user_id) \
-                        .eq("type", v_type) \
-                        .order("recorded_at", desc=True) \
-                        .limit(1) \
-                        .execute()
-                    
-                    if res.data:
-                        latest = res.data[0]
-                        vitals[v_type]["value"] = latest["value"]
-                        vitals[v_type]["unit"] = latest["unit"]
-                        # Trend logic would go here (comparing to previous record)
-                        vitals[v_type]["trend"] = "Updated just now"
-                except Exception:
-                    # If table doesn't exist or other DB error, just skip this vital
+            # One round trip for the two most recent readings of every type
+            rows = await repository.latest_vitals([user_id], VITAL_TYPES, per_type=2)
+            readings = {}
+            for row in rows:
+                readings.setdefault(row["type"], {})[row["rank"]] = row
+
+            for v_type, ranked in readings.items():
+                latest = ranked.get(1)
+                if not latest or v_type not in vitals:
                     continue
+                vitals[v_type]["value"] = latest["value"]
+                vitals[v_type]["unit"] = latest["unit"]
+                vitals[v_type]["trend"] = self._trend(latest, ranked.get(2))
                     
         except Exception as e:
             print(f"Error fetching vitals: {e}")
@@ -55,19 +81,135 @@ class DashboardService:
         }
 
     async def get_family_dashboard(self, family_id: str) -> Dict[str, Any]:
-        # Mock data for now
-        return {
-            "family_members": [
-                {"id": 1, "name": "Dad", "initial": "D", "status": "good", "mood": "😊", "color": "border-green-500"},
-                {"id": 2, "name": "Mom", "initial": "M", "status": "warning", "mood": "😐", "color": "border-yellow-500"},
-                {"id": 3, "name": "Sarah", "initial": "S", "status": "good", "mood": "😄", "color": "border-green-500"},
-                {"id": 4, "name": "Mike", "initial": "M", "status": "danger", "mood": "😓", "color": "border-red-500"},
-            ],
-            "overall_vibe": "Balanced",
-            "alerts": [
-                {"id": 1, "type": "warning", "message": "Mom's glucose slightly high", "time": "10m ago"},
-                {"id": 2, "type": "info", "message": "Dad completed morning workout", "time": "1h ago"},
-            ]
+        cached = self._family_cache.get(family_id)
+        if cached is not None:
+            return cached
+
+        from backend.core.repository import repository
+        from backend.core.member_cache import member_cache
+
+        members = await member_cache.family_members(family_id)
+        member_ids = [m["id"] for m in members]
+        for member_id in member_ids:
+            self._member_family.set(member_id, family_id)
+
+        # Every member's data comes from three bulk queries issued together
+        vitals_rows, schedules, inventory = await asyncio.gather(
+            repository.latest_vitals(member_ids, VITAL_TYPES, per_type=1) if member_ids else asyncio.sleep(0, result=[]),
+            repository.list_schedules(family_id, date=date.today().isoformat()),
+            repository.list_inventory(family_id=family_id),
+        )
+
+        latest_by_member: Dict[str, Dict[str, Any]] = {}
+        for row in vitals_rows:
+            latest_by_member.setdefault(row["user_id"], {})[row["type"]] = row
+
+        schedule_by_member: Dict[Optional[str], Dict[str, int]] = {}
+        for item in schedules:
+            counts = schedule_by_member.setdefault(item.get("assigned_to"), {"completed": 0, "total": 0})
+            counts["total"] += 1
+            if item.get("status") == "completed":
+                counts["completed"] += 1
+
+        expiring = [item for item in inventory if self._is_expiring(item)]
+        expiring_by_member: Dict[str, int] = {}
+        for item in expiring:
+            expiring_by_member[item.get("user_id")] = expiring_by_member.get(item.get("user_id"), 0) + 1
+
+        family_members = []
+        alerts = []
+        for member in members:
+            name = member.get("full_name") or "Member"
+            latest = latest_by_member.get(member["id"], {})
+            status = "good"
+            for v_type, reading in latest.items():
+                level = self._vital_status(v_type, float(reading["value"]))
+                if level == "good":
+                    continue
+                if level == "danger" or status == "good":
+                    status = level
+                alerts.append({
+                    "id": len(alerts) + 1,
+                    "type": level,
+                    "message": f"{name}'s {v_type.replace('_', ' ')} is {reading['value']} {reading['unit']}",
+                    "time": self._ago(reading["recorded_at"]),
+                })
+
+            family_members.append({
+                "id": member["id"],
+                "name": name,
+                "initial": name[:1].upper(),
+                "status": status,
+                "mood": STATUS_MOODS[status],
+                "color": STATUS_COLORS[status],
+                "vitals": {v_type: reading["value"] for v_type, reading in latest.items()},
+                "schedule": schedule_by_member.get(member["id"], {"completed": 0, "total": 0}),
+                "expiring_items": expiring_by_member.get(member["id"], 0),
+            })
+
+        if expiring:
+            alerts.append({
+                "id": len(alerts) + 1,
+                "type": "info",
+                "message": f"{len(expiring)} kitchen item{'s' if len(expiring) != 1 else ''} expiring soon",
+                "time": "today",
+            })
+
+        statuses = {m["status"] for m in family_members}
+        if "danger" in statuses:
+            overall_vibe = "Needs attention"
+        elif "warning" in statuses:
+            overall_vibe = "Mixed"
+        else:
+            overall_vibe = "Balanced"
+
+        result = {
+            "family_members": family_members,
+            "overall_vibe": overall_vibe,
+            "alerts": alerts,
         }
+        self._family_cache.set(family_id, result)
+        return result
+
+    def invalidate_family(self, family_id: Optional[str]):
+        if family_id:
+            self._family_cache.invalidate(family_id)
+
+    def invalidate_member(self, user_id: Optional[str]):
+        self.invalidate_family(self._member_family.get(user_id))
+
+    @staticmethod
+    def _vital_status(v_type: str, value: float) -> str:
+        thresholds = VITAL_THRESHOLDS.get(v_type)
+        if not thresholds:
+            return "good"
+        for level in ("danger", "warning"):
+            low, high = thresholds[level]
+            if (low is not None and value < low) or (high is not None and value > high):
+                return level
+        return "good"
+
+    @staticmethod
+    def _is_expiring(item: Dict[str, Any]) -> bool:
+        if item.get("status") in ("expiring", "expired"):
+            return True
+        try:
+            expiry = date.fromisoformat(str(item.get("expiry_date"))[:10])
+        except ValueError:
+            return False
+        return expiry <= date.today() + timedelta(days=EXPIRY_WINDOW_DAYS)
+
+    @staticmethod
+    def _ago(timestamp: str) -> str:
+        try:
+            recorded = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            return ""
+        minutes = int((datetime.now(timezone.utc) - recorded).total_seconds() // 60)
+        if minutes < 60:
+            return f"{max(minutes, 0)}m ago"
+        if minutes < 24 * 60:
+            return f"{minutes // 60}h ago"
+        return f"{minutes // (24 * 60)}d ago"
 
 dashboard_service = DashboardService()
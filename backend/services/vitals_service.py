@@ -0,0 +1,339 @@
+import os
+import re
+import csv
+import json
+import time
+import asyncio
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+
+VITALS_BULK_BATCH_SIZE = int(os.getenv("VITALS_BULK_BATCH_SIZE", "5000"))
+VITALS_BULK_CHUNK_SIZE = int(os.getenv("VITALS_BULK_CHUNK_SIZE", "1000"))
+VITALS_BULK_CONCURRENCY = int(os.getenv("VITALS_BULK_CONCURRENCY", "4"))
+VITALS_BULK_MAX_ROWS = int(os.getenv("VITALS_BULK_MAX_ROWS", "500000"))
+# A longer line can't be a single reading; the upload is refused rather than buffered
+VITALS_BULK_MAX_LINE_BYTES = int(os.getenv("VITALS_BULK_MAX_LINE_BYTES", "65536"))
+
+# Plausible (low, high) range and stored unit per known type; other types need an explicit unit
+VITAL_RANGES = {
+    "heart_rate": (20, 250, "bpm"),
+    "resting_heart_rate": (20, 200, "bpm"),
+    "hrv": (0, 300, "ms"),
+    "spo2": (50, 100, "%"),
+    "respiratory_rate": (4, 60, "breaths/min"),
+    "glucose": (20, 600, "mg/dL"),
+    "temperature": (30, 45, "°C"),
+    "steps": (0, 100000, "steps"),
+    "sleep": (0, 24, "hours"),
+    "calories": (0, 20000, "kcal"),
+    "weight": (1, 500, "kg"),
+}
+
+# Units accepted per known type (case-insensitive) and the (scale, offset) that converts a
+# value to the stored unit; a type's stored unit is always accepted as-is
+UNIT_CONVERSIONS = {
+    "heart_rate": {"beats/min": (1.0, 0.0), "bpm": (1.0, 0.0)},
+    "resting_heart_rate": {"beats/min": (1.0, 0.0), "bpm": (1.0, 0.0)},
+    "spo2": {"percent": (1.0, 0.0)},
+    "respiratory_rate": {"rpm": (1.0, 0.0), "breaths per minute": (1.0, 0.0)},
+    "glucose": {"mg/dl": (1.0, 0.0), "mmol/l": (18.016, 0.0)},
+    "temperature": {"c": (1.0, 0.0), "celsius": (1.0, 0.0), "°f": (5 / 9, -160 / 9), "f": (5 / 9, -160 / 9), "fahrenheit": (5 / 9, -160 / 9)},
+    "steps": {"step": (1.0, 0.0), "count": (1.0, 0.0)},
+    "sleep": {"h": (1.0, 0.0), "hr": (1.0, 0.0), "hrs": (1.0, 0.0), "min": (1 / 60, 0.0), "minutes": (1 / 60, 0.0)},
+    "calories": {"kcal": (1.0, 0.0), "cal": (1.0, 0.0)},
+    "weight": {"kg": (1.0, 0.0), "lb": (0.45359237, 0.0), "lbs": (0.45359237, 0.0)},
+}
+
+# Readings stamped further than this into the future are treated as clock errors
+MAX_CLOCK_SKEW_SECONDS = 300
+# Earliest accepted recorded_at (2000-01-01 UTC); anything older is a bad clock or a bad column
+EARLIEST_RECORDED_AT = 946684800.0
+# Unix timestamps above this are taken to be in milliseconds
+_MILLISECOND_EPOCH_THRESHOLD = 1e11
+
+# Windows up to this long are served from raw points; longer ones from hourly rollups,
+# and beyond SERIES_HOURLY_MAX_WINDOW from daily ones, so a chart is at most ~750 points
+SERIES_RAW_MAX_WINDOW = timedelta(hours=float(os.getenv("SERIES_RAW_MAX_HOURS", "6")))
+SERIES_HOURLY_MAX_WINDOW = timedelta(days=float(os.getenv("SERIES_HOURLY_MAX_DAYS", "31")))
+# Points per series response. One extra row is requested to detect truncation, which
+# stays within PostgREST's default max-rows of 1000
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", "999"))
+
+_TYPE_RE = re.compile(r"^[a-z0-9_]{1,40}$")
+MAX_REPORTED_ERRORS = 20
+
+
+class TooManyRows(Exception):
+    pass
+
+
+class LineTooLong(Exception):
+    pass
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_epoch(value: Any) -> float:
+    """Seconds since the epoch for an ISO-8601 string (naive = UTC) or a unix timestamp
+    in seconds or milliseconds, given as a number or a numeric string."""
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    if isinstance(value, str) and re.fullmatch(r"\s*\d+(\.\d+)?\s*", value):
+        value = float(value)
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return value / 1000 if value > _MILLISECOND_EPOCH_THRESHOLD else value
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except (TypeError, ValueError):
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def validate_batch(user_id: str, rows: List[Tuple[int, Dict[str, Any]]], source: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """Checks a batch of (line number, row) pairs with array operations.
+
+    Returns (records ready to insert, errors, number of in-batch duplicates dropped).
+    """
+    if not rows:
+        return [], [], 0
+
+    types = np.array([str(row.get("type", "")).strip().lower() for _, row in rows], dtype=object)
+    units = np.array([str(row.get("unit") or "").strip() for _, row in rows], dtype=object)
+    values = np.array([_to_float(row.get("value")) for _, row in rows], dtype=np.float64)
+    stamps = np.array([_to_epoch(row.get("recorded_at", row.get("timestamp"))) for _, row in rows], dtype=np.float64)
+    # Millisecond precision keeps re-sent exports comparing equal to stored readings
+    stamps = np.round(stamps, 3)
+
+    reasons = np.full(len(rows), "", dtype=object)
+
+    type_ok = np.array([bool(_TYPE_RE.match(t)) for t in types])
+    reasons[~type_ok] = "invalid type"
+    reasons[(reasons == "") & ~np.isfinite(values)] = "value is not a number"
+    reasons[(reasons == "") & ~np.isfinite(stamps)] = "invalid recorded_at"
+    reasons[(reasons == "") & (stamps > time.time() + MAX_CLOCK_SKEW_SECONDS)] = "recorded_at is in the future"
+    reasons[(reasons == "") & (stamps < EARLIEST_RECORDED_AT)] = "recorded_at is before 2000"
+
+    lowered = np.array([unit.lower() for unit in units], dtype=object)
+    for vital_type, (low, high, unit) in VITAL_RANGES.items():
+        of_type = types == vital_type
+        if not of_type.any():
+            continue
+        # Convert accepted units to the stored one; anything else is rejected, not stored as-is
+        accepted = of_type & ((units == "") | (lowered == unit.lower()))
+        for alias, (scale, offset) in UNIT_CONVERSIONS.get(vital_type, {}).items():
+            matches = of_type & (lowered == alias)
+            values[matches] = values[matches] * scale + offset
+            accepted |= matches
+        reasons[(reasons == "") & of_type & ~accepted] = f"unit not accepted for {vital_type} (expected {unit})"
+        units[of_type & accepted] = unit
+        reasons[(reasons == "") & of_type & ((values < low) | (values > high))] = f"{vital_type} outside {low}-{high} {unit}"
+    reasons[(reasons == "") & (units == "")] = "unit is required for this type"
+
+    valid = reasons == ""
+
+    # Keep the first reading per (type, recorded_at) within the batch
+    _, type_codes = np.unique(types, return_inverse=True)
+    candidates = np.flatnonzero(valid)
+    order = candidates[np.lexsort((candidates, stamps[candidates], type_codes[candidates]))]
+    repeated = (type_codes[order[1:]] == type_codes[order[:-1]]) & (stamps[order[1:]] == stamps[order[:-1]])
+    keep = valid.copy()
+    keep[order[1:][repeated]] = False
+    duplicates = int(repeated.sum())
+
+    records = [
+        {
+            "user_id": user_id,
+            "type": types[i],
+            "value": round(float(values[i]), 4),
+            "unit": units[i],
+            "recorded_at": datetime.fromtimestamp(stamps[i], tz=timezone.utc).isoformat(),
+            "source": source,
+        }
+        for i in np.flatnonzero(keep)
+    ]
+    errors = [{"line": rows[i][0], "error": reasons[i]} for i in np.flatnonzero(~valid)]
+    return records, errors, duplicates
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = VITALS_BULK_MAX_LINE_BYTES) -> AsyncIterator[str]:
+    """Splits a byte stream into decoded lines without holding the whole body.
+
+    Only the unfinished line is buffered, and it may not grow past `max_line_bytes`.
+    """
+    pending = bytearray()
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            pending += chunk[start:end]
+            if len(pending) > max_line_bytes:
+                raise LineTooLong(f"line longer than {max_line_bytes} bytes")
+            yield pending.decode("utf-8-sig").rstrip("\r")
+            pending = bytearray()
+            start = end + 1
+        pending += chunk[start:]
+        if len(pending) > max_line_bytes:
+            raise LineTooLong(f"line longer than {max_line_bytes} bytes")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_rows(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """(line number, row) for NDJSON or headed CSV; row is None when the line can't be parsed."""
+    header = None
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            fields = next(csv.reader([line]))
+            if header is None:
+                header = [field.strip().lower() for field in fields]
+                continue
+            yield number, dict(zip(header, fields))
+        else:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+class VitalsIngestor:
+    """Validates a device export in batches and writes it in chunked, de-duplicated upserts."""
+
+    def __init__(self, user_id: str, source: str = "device"):
+        self.user_id = user_id
+        self.source = source
+        self.received = 0
+        self.accepted = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._semaphore = asyncio.Semaphore(VITALS_BULK_CONCURRENCY)
+
+    async def _write(self, chunk: List[Dict[str, Any]]):
+        from backend.core.repository import repository
+        async with self._semaphore:
+            self.inserted += await repository.upsert_vitals(chunk)
+
+    async def _flush(self, batch: List[Tuple[int, Dict[str, Any]]]):
+        records, errors, duplicates = validate_batch(self.user_id, batch, self.source)
+        self.accepted += len(records)
+        self.duplicates += duplicates
+        self._reject(errors)
+        await asyncio.gather(*(self._write(records[i:i + VITALS_BULK_CHUNK_SIZE]) for i in range(0, len(records), VITALS_BULK_CHUNK_SIZE)))
+        if records:
+            from backend.services.anomaly_service import anomaly_engine
+            anomaly_engine.observe(self.user_id, records)
+
+    def _reject(self, errors: List[Dict[str, Any]]):
+        self.rejected += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    async def ingest(self, rows: AsyncIterator[Tuple[int, Optional[Dict[str, Any]]]]) -> Dict[str, Any]:
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        async for number, row in rows:
+            self.received += 1
+            if self.received > VITALS_BULK_MAX_ROWS:
+                raise TooManyRows(f"upload exceeds {VITALS_BULK_MAX_ROWS} rows")
+            if row is None:
+                self._reject([{"line": number, "error": "unparseable row"}])
+                continue
+            batch.append((number, row))
+            if len(batch) >= VITALS_BULK_BATCH_SIZE:
+                await self._flush(batch)
+                batch = []
+        await self._flush(batch)
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "accepted": self.accepted,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates + (self.accepted - self.inserted),
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    window = end - start
+    if window <= SERIES_RAW_MAX_WINDOW:
+        return "raw"
+    if window <= SERIES_HOURLY_MAX_WINDOW:
+        return "hour"
+    return "day"
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Start of the UTC hour/day bucket containing `moment` (same as date_trunc in the rollups)."""
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if resolution == "day" else moment
+
+
+async def _raw_points(user_id: str, vital_type: str, start: datetime, end: datetime) -> Tuple[List[Dict[str, Any]], Optional[str], bool]:
+    from backend.core.repository import repository
+    # One row past the cap tells a full window from a capped one; newest first, so a cap keeps the end
+    rows = await repository.list_vitals(user_id, vital_type, start.isoformat(), end.isoformat(), SERIES_MAX_POINTS + 1)
+    truncated = len(rows) > SERIES_MAX_POINTS
+    rows = rows[:SERIES_MAX_POINTS][::-1]
+    points = [{"t": r["recorded_at"], "avg": r["value"], "min": r["value"], "max": r["value"], "count": 1} for r in rows]
+    return points, rows[0]["unit"] if rows else None, truncated
+
+
+async def _rollup_points(user_id: str, vital_type: str, resolution: str, start: datetime, end: datetime) -> Tuple[List[Dict[str, Any]], bool]:
+    from backend.core.repository import repository
+    # The bucket holding `start` begins before it; without truncating, the first partial hour/day is lost
+    first_bucket = bucket_start(start, resolution)
+    rows = await repository.list_vitals_rollups(user_id, vital_type, resolution, first_bucket.isoformat(), end.isoformat(), SERIES_MAX_POINTS + 1)
+    truncated = len(rows) > SERIES_MAX_POINTS
+    points = [
+        {"t": r["bucket"], "avg": round(float(r["sum"]) / r["count"], 2), "min": float(r["min"]), "max": float(r["max"]), "count": r["count"]}
+        for r in rows[:SERIES_MAX_POINTS][::-1]
+    ]
+    return points, truncated
+
+
+async def get_series(user_id: str, vital_type: str, start: datetime, end: datetime, resolution: str = "auto") -> Dict[str, Any]:
+    """Chart series for [start, end): raw points for short windows, hourly/daily rollups otherwise.
+
+    Every point has the same shape (t, avg, min, max, count) whatever the resolution.
+    With resolution="auto", a raw window holding more than SERIES_MAX_POINTS readings is
+    served from hourly rollups instead, so the whole window is covered. Otherwise at most
+    SERIES_MAX_POINTS points are returned, the most recent ones, and `truncated` is set.
+    """
+    auto = resolution == "auto"
+    if auto:
+        resolution = pick_resolution(start, end)
+
+    unit = None
+    if resolution == "raw":
+        points, unit, truncated = await _raw_points(user_id, vital_type, start, end)
+        if truncated and auto:
+            resolution = "hour"
+    if resolution != "raw":
+        points, truncated = await _rollup_points(user_id, vital_type, resolution, start, end)
+
+    if unit is None and vital_type in VITAL_RANGES:
+        unit = VITAL_RANGES[vital_type][2]
+    return {
+        "type": vital_type,
+        "unit": unit,
+        "resolution": resolution,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": points,
+        "truncated": truncated,
+    }
@@ -0,0 +1,28 @@
+import numpy as np
+
+from backend.services.anomaly_service import score, ANOMALY_MIN_STD
+
+
+def _series(values):
+    values = np.array(values, dtype=np.float64)
+    return np.zeros(len(values), dtype=np.int64), np.arange(len(values), dtype=np.float64), values
+
+
+def test_score_floors_std_of_flat_baseline():
+    groups, stamps, values = _series([70, 71] * 15 + [72])
+    min_std = np.full(len(values), ANOMALY_MIN_STD["heart_rate"])
+    _, _, z = score(groups, stamps, values, min_std)
+    assert abs(z[-1]) < 1
+
+
+def test_score_still_flags_large_jump():
+    groups, stamps, values = _series([70, 71] * 15 + [85])
+    min_std = np.full(len(values), ANOMALY_MIN_STD["heart_rate"])
+    _, _, z = score(groups, stamps, values, min_std)
+    assert z[-1] > 3
+
+
+def test_score_uses_relative_floor_for_unknown_types():
+    groups, stamps, values = _series([10, 10.01] * 15 + [10.05])
+    _, _, z = score(groups, stamps, values)
+    assert abs(z[-1]) < 1
@@ -0,0 +1,57 @@
+import base64
+import hashlib
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from backend.core.attachments import attachment_digest
+from backend.main import ChatRequest, resolve_attachments
+
+
+def _inline(text):
+    return {"type": "text/plain", "name": "note.txt", "data": base64.b64encode(text.encode()).decode()}
+
+
+def test_inline_ref_from_another_user_is_rejected():
+    request = ChatRequest(message="hi", user_id="attacker", attachments=[{"type": "text/plain", "name": "x", "ref": str(uuid.uuid4())}])
+    with pytest.raises(HTTPException) as e:
+        resolve_attachments(request)
+    assert e.value.status_code == 400
+
+
+def test_inline_sha256_is_rejected():
+    request = ChatRequest(message="hi", user_id="u", attachments=[{**_inline("POISON"), "sha256": "abc"}])
+    with pytest.raises(HTTPException) as e:
+        resolve_attachments(request)
+    assert e.value.status_code == 400
+
+
+def test_plain_inline_attachments_pass_through():
+    attachments = [_inline("hello")]
+    assert resolve_attachments(ChatRequest(message="hi", user_id="u", attachments=attachments)) == attachments
+
+
+def test_digest_is_computed_from_decoded_inline_data():
+    assert attachment_digest({**_inline("hello"), "sha256": "abc"}) == hashlib.sha256(b"hello").hexdigest()
+
+
+def test_purge_keeps_fresh_sidecars_and_drops_stale_orphans(tmp_path):
+    from backend.core.attachment_store import AttachmentStore
+
+    store = AttachmentStore(str(tmp_path))
+    old = 0
+    orphan = tmp_path / f"{uuid.uuid4()}.bin"
+    orphan.write_bytes(b"x")
+    os.utime(orphan, (old, old))
+    writing = tmp_path / f"{uuid.uuid4()}.json"
+    writing.write_text("{")
+    broken = tmp_path / f"{uuid.uuid4()}.json"
+    broken.write_text("{")
+    os.utime(broken, (old, old))
+
+    store.purge_expired()
+    assert not orphan.exists()
+    assert writing.exists()
+    assert not broken.exists()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from backend.agents import context
+from backend.core import memory
+from backend.core.repository import repository
+from backend.core.member_cache import member_cache
+
+USER = "00000000-0000-0000-0000-000000000001"
+FAMILIES = {
+    "family-a": ([{"id": "a1", "full_name": "Alice"}], [{"time": "09:00", "title": "Dentist"}]),
+    "family-b": ([{"id": "b1", "full_name": "Bob"}], [{"time": "10:00", "title": "Soccer"}]),
+}
+
+
+class _Memories:
+    async def query_memory(self, user_id, message):
+        return []
+
+
+@pytest.fixture(autouse=True)
+def fake_data(monkeypatch):
+    async def get_profile(user_id, columns="*"):
+        return {"id": user_id, "family_id": "family-a", "profile_data": {}}
+
+    async def latest_vitals(*args, **kwargs):
+        return []
+
+    async def family_members(family_id):
+        return FAMILIES[family_id][0]
+
+    async def list_schedules(family_id, **kwargs):
+        return FAMILIES[family_id][1]
+
+    monkeypatch.setattr(repository, "get_profile", get_profile)
+    monkeypatch.setattr(repository, "latest_vitals", latest_vitals)
+    monkeypatch.setattr(repository, "list_schedules", list_schedules)
+    monkeypatch.setattr(member_cache, "family_members", family_members)
+    monkeypatch.setattr(memory, "memory_manager", _Memories(), raising=False)
+
+
+def _build(client_family_id):
+    client_context = {"profile": {"family_id": client_family_id}}
+    return asyncio.run(context.build_request_context(USER, "hello", client_context, session_id="test-context"))
+
+
+def test_matching_client_family_is_used():
+    ctx = _build("family-a")
+    assert ctx.family_id == "family-a"
+    assert [m["full_name"] for m in ctx.family_members] == ["Alice"]
+
+
+def test_foreign_client_family_is_replaced_by_stored_family():
+    ctx = _build("family-b")
+    assert ctx.family_id == "family-a"
+    assert [m["full_name"] for m in ctx.family_members] == ["Alice"]
+    assert [s["title"] for s in ctx.schedule_today] == ["Dentist"]
+    assert "Bob" not in ctx.summary() and "Soccer" not in ctx.summary()
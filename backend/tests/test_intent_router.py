@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from backend.agents.intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    router = IntentRouter(llm_escalation=True)
+
+    async def fail(message):
+        raise AssertionError(f"LLM asked about {message!r}")
+
+    router._ask_llm = fail
+    return router
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello!", "thanks", "thank you so much", "ok", "good night", "bye"])
+def test_small_talk_routes_to_concierge_without_llm(router, message):
+    assert asyncio.run(router.route(message)) == ("concierge", 1.0, "local")
+
+
+def test_greeting_does_not_mask_intent(router):
+    persona, _, source = asyncio.run(router.route("hi, I feel so lonely"))
+    assert (persona, source) == ("companion", "local")
+
+
+def test_short_message_without_signal_stays_local(router):
+    persona, _, source = asyncio.run(router.route("what is this"))
+    assert (persona, source) == ("concierge", "local")
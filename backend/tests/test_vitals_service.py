@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+
+from backend.services.vitals_service import validate_batch, iter_lines, iter_rows, LineTooLong
+
+USER = "00000000-0000-0000-0000-000000000001"
+STAMP = "2024-05-01T08:00:00+00:00"
+
+
+def _rows(*rows):
+    return list(enumerate(rows, start=1))
+
+
+def _collect(aiter):
+    async def run():
+        return [item async for item in aiter]
+    return asyncio.run(run())
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_validate_batch_fills_default_unit():
+    records, errors, duplicates = validate_batch(USER, _rows({"type": "heart_rate", "value": "72", "recorded_at": STAMP}), "device")
+    assert errors == [] and duplicates == 0
+    assert records[0]["unit"] == "bpm"
+    assert records[0]["value"] == 72.0
+    assert records[0]["recorded_at"] == STAMP
+
+
+def test_validate_batch_rejects_unknown_unit():
+    records, errors, _ = validate_batch(USER, _rows({"type": "heart_rate", "value": 72, "unit": "bps", "recorded_at": STAMP}), "device")
+    assert records == []
+    assert errors[0]["line"] == 1 and "unit not accepted" in errors[0]["error"]
+
+
+@pytest.mark.parametrize("vital_type, value, unit, expected, stored_unit", [
+    ("weight", 150, "lb", 68.0389, "kg"),
+    ("glucose", 5.5, "mmol/L", 99.088, "mg/dL"),
+    ("temperature", 98.6, "°F", 37.0, "°C"),
+])
+def test_validate_batch_converts_units(vital_type, value, unit, expected, stored_unit):
+    records, errors, _ = validate_batch(USER, _rows({"type": vital_type, "value": value, "unit": unit, "recorded_at": STAMP}), "device")
+    assert errors == []
+    assert records[0]["unit"] == stored_unit
+    assert records[0]["value"] == pytest.approx(expected, abs=1e-3)
+
+
+def test_validate_batch_range_check_uses_converted_value():
+    # 1200 lb is 544 kg, above the 500 kg limit
+    _, errors, _ = validate_batch(USER, _rows({"type": "weight", "value": 1200, "unit": "lb", "recorded_at": STAMP}), "device")
+    assert "outside" in errors[0]["error"]
+
+
+@pytest.mark.parametrize("recorded_at, ok", [
+    ("1714550400", True),       # unix seconds as a CSV string
+    ("1714550400000", True),    # unix milliseconds
+    (1714550400, True),
+    (True, False),
+    (1, False),                 # 1970
+    ("1999-12-31T23:59:59", False),
+    ("not a date", False),
+])
+def test_validate_batch_recorded_at(recorded_at, ok):
+    records, errors, _ = validate_batch(USER, _rows({"type": "steps", "value": 100, "recorded_at": recorded_at}), "device")
+    assert bool(records) is ok
+    if ok:
+        assert records[0]["recorded_at"] == STAMP
+    else:
+        assert errors
+
+
+def test_validate_batch_drops_in_batch_duplicates():
+    row = {"type": "spo2", "value": 97, "recorded_at": STAMP}
+    records, errors, duplicates = validate_batch(USER, _rows(row, dict(row, value=96), {**row, "type": "heart_rate", "value": 60}), "device")
+    assert errors == []
+    assert duplicates == 1
+    assert sorted((r["type"], r["value"]) for r in records) == [("heart_rate", 60.0), ("spo2", 97.0)]
+
+
+def test_iter_rows_csv_and_ndjson():
+    csv_lines = _chunks("type,value,unit,recorded_at", "", "heart_rate,70,bpm," + STAMP)
+    assert _collect(iter_rows(csv_lines, "csv")) == [(3, {"type": "heart_rate", "value": "70", "unit": "bpm", "recorded_at": STAMP})]
+
+    ndjson_lines = _chunks('{"type": "spo2", "value": 98}', "not json", "[1, 2]")
+    assert _collect(iter_rows(ndjson_lines, "ndjson")) == [(1, {"type": "spo2", "value": 98}), (2, None), (3, None)]
+
+
+def test_iter_lines_splits_across_chunks():
+    lines = _collect(iter_lines(_chunks(b"\xef\xbb\xbfa,b\r\nc,", b"d\n", b"e,f")))
+    assert lines == ["a,b", "c,d", "e,f"]
+
+
+def test_iter_lines_caps_line_length():
+    with pytest.raises(LineTooLong):
+        _collect(iter_lines(_chunks(b"x" * 10, b"x" * 10), max_line_bytes=15))
+
+
+def _series(monkeypatch, raw_count, resolution="auto"):
+    from datetime import datetime, timedelta, timezone
+    from backend.core.repository import repository
+    from backend.services.vitals_service import get_series
+
+    calls = []
+
+    async def list_vitals(user_id, vital_type, start, end, limit):
+        calls.append(("raw", start, limit))
+        rows = [{"recorded_at": str(i), "value": 70.0, "unit": "bpm"} for i in range(raw_count, 0, -1)]
+        return rows[:limit]
+
+    async def list_vitals_rollups(user_id, vital_type, res, start, end, limit):
+        calls.append((res, start, limit))
+        return [{"bucket": "2024-05-01T08:00:00+00:00", "count": 2, "sum": 140, "min": 69, "max": 71}]
+
+    monkeypatch.setattr(repository, "list_vitals", list_vitals)
+    monkeypatch.setattr(repository, "list_vitals_rollups", list_vitals_rollups)
+    end = datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)
+    return asyncio.run(get_series(USER, "heart_rate", end - timedelta(hours=2), end, resolution)), calls
+
+
+def test_series_full_raw_window_is_not_truncated(monkeypatch):
+    from backend.services.vitals_service import SERIES_MAX_POINTS
+    series, _ = _series(monkeypatch, SERIES_MAX_POINTS)
+    assert series["resolution"] == "raw" and not series["truncated"]
+    assert len(series["points"]) == SERIES_MAX_POINTS
+    assert series["points"][0]["t"] == "1"
+
+
+def test_series_capped_raw_window_falls_back_to_hourly(monkeypatch):
+    from backend.services.vitals_service import SERIES_MAX_POINTS
+    series, calls = _series(monkeypatch, SERIES_MAX_POINTS + 50)
+    assert series["resolution"] == "hour" and not series["truncated"]
+    # The rollup query starts at the hour holding `from`
+    assert calls[-1][1] == "2024-05-01T06:00:00+00:00"
+
+
+def test_series_explicit_raw_reports_truncation(monkeypatch):
+    from backend.services.vitals_service import SERIES_MAX_POINTS
+    series, _ = _series(monkeypatch, SERIES_MAX_POINTS + 50, resolution="raw")
+    assert series["resolution"] == "raw" and series["truncated"]
+    assert series["points"][-1]["t"] == str(SERIES_MAX_POINTS + 50)
@@ -29,3 +29,30 @@ export const chatApi = {
         return response.data;
     }
 };
+
+export interface VitalsSeriesPoint {
+    t: string;
+    avg: number;
+    min: number;
+    max: number;
+    count: number;
+}
+
+export interface VitalsSeries {
+    type: string;
+    unit: string | null;
+    resolution: 'raw' | 'hour' | 'day';
+    from: string;
+    to: string;
+    points: VitalsSeriesPoint[];
+    truncated: boolean; // the window held more points than returned; the most recent are kept
+}
+
+export const vitalsApi = {
+    getSeries: async (userId: string, type: string, from?: string, to?: string, resolution: 'auto' | 'raw' | 'hour' | 'day' = 'auto') => {
+        const response = await apiClient.get<VitalsSeries>(`/api/vitals/${userId}/series`, {
+            params: { type, from, to, resolution }
+        });
+        return response.data;
+    }
+};
@@ -22,12 +22,15 @@ export interface Routine {
 }
 
 export interface FamilyMember {
-    id: number;
+    id: string;
     name: string;
     initial: string;
     status: "good" | "warning" | "danger";
     mood: string;
     color: string;
+    vitals?: Record<string, number>;
+    schedule?: { completed: number; total: number };
+    expiring_items?: number;
 }
 
 export interface Alert {